@@ -1,3 +1,4 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
@@ -6,14 +7,22 @@ from dotenv import load_dotenv
 # Import routers
 from .routes import projects, budget, quotes, ai_budget, debug, quote_scopes, ai_chat
 from .db import test_connection
+from .services.ai_rfq_generator import ai_rfq_generator
 
 # Load environment variables
 load_dotenv()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close pooled OpenAI connections on shutdown
+    await ai_rfq_generator.aclose()
+
 app = FastAPI(
     title="Operation Protect Profit API",
     description="Construction bid management and comparison API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configure CORS
@@ -5,7 +5,7 @@ import uuid
 from datetime import datetime
 
 from ..db import get_supabase_client
-from ..services.deterministic_parser import parse_estimate_xlsx
+from ..services.deterministic_parser import parse_estimate_xlsx, strip_private_fields
 from ..services.excel_parser import ExcelBudgetParser
 
 router = APIRouter(prefix="/ai-budget", tags=["ai-budget"])
@@ -152,7 +152,7 @@ async def smart_budget_upload(
             "project_subtotal": result.get('projectSubtotal', 0),
             "overhead_profit": result.get('overheadAndProfit', 0),
             "grand_total_from_items": result.get('grandTotalFromItems', 0),
-            "analysis_summary": result,
+            "analysis_summary": strip_private_fields(result),
             "preview": budget_items[:10]  # First 10 items
         }
         
@@ -144,7 +144,8 @@ async def analyze_budget_file(
         # For Excel files, full multi-tab analysis
         parser = ExcelBudgetParser()
         try:
-            analysis = parser.analyze_workbook(file_content)
+            # The sheet picker shows previews and column suggestions for every sheet
+            analysis = parser.analyze_workbook(file_content, force=True)
             print(f"Analysis completed successfully: {len(analysis.get('sheet_analysis', []))} sheets found")
             
             return {
@@ -3,12 +3,13 @@ from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 import uuid
 import os
+from urllib.parse import quote
 from datetime import datetime
 
 from ..db import get_supabase_client
 from ..services.ai_rfq_generator import ai_rfq_generator
 from ..services.word_rfq_generator import word_rfq_generator
-from fastapi.responses import FileResponse
+from fastapi.responses import Response
 
 router = APIRouter(prefix="/quote-scopes", tags=["quote-scopes"])
 
@@ -188,7 +189,7 @@ async def enhance_scope_with_ai(request: Dict[str, Any]):
         if not scope_description.strip():
             raise HTTPException(status_code=400, detail="Scope description is required")
         
-        enhanced_rfq = ai_rfq_generator.generate_rfq(scope_description, project_context)
+        enhanced_rfq = await ai_rfq_generator.generate_rfq_async(scope_description, project_context)
         
         return {
             "message": "Scope enhanced successfully",
@@ -219,16 +220,21 @@ async def download_rfq_word_doc(scope_id: str = Path(...)):
         project_result = supabase.table("projects").select("*").eq("id", scope["project_id"]).execute()
         project = project_result.data[0] if project_result.data else {}
         
-        # Generate Word document
-        file_path = word_rfq_generator.generate_rfq_document(scope, project)
+        # Generate Word document in memory
+        content = word_rfq_generator.generate_rfq_document(scope, project, return_bytes=True)
         
         # Return file for download
         filename = f"RFQ_{project.get('name', 'Project').replace(' ', '_')}_{scope.get('scope_type', 'scope')}.docx"
-        
-        return FileResponse(
-            file_path,
+        quoted_filename = quote(filename)
+        if quoted_filename != filename:
+            content_disposition = f"attachment; filename*=utf-8''{quoted_filename}"
+        else:
+            content_disposition = f'attachment; filename="{filename}"'
+        
+        return Response(
+            content=content,
             media_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            filename=filename
+            headers={'Content-Disposition': content_disposition}
         )
         
     except HTTPException:
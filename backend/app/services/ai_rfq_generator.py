@@ -1,27 +1,40 @@
 import openai
+import httpx
 import os
-from typing import Dict, Any, Optional
+import io
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
 
-class AIRFQGenerator:
-    def __init__(self):
-        # Get OpenAI API key from environment
-        self.openai_api_key = os.getenv('OPENAI_API_KEY')
-        if self.openai_api_key:
-            openai.api_key = self.openai_api_key
-    
-    def generate_rfq(self, scope_description: str, project_context: Optional[Dict[str, Any]] = None) -> str:
-        """Generate professional RFQ from scope description using OpenAI"""
-        
-        system_prompt = """You are an expert construction project manager and procurement specialist with 20+ years of experience writing Request for Quotes (RFQs) for commercial and residential construction projects. Your task is to transform brief scope descriptions into comprehensive, professional RFQs that will get accurate, competitive bids from qualified contractors."""
-        
-        user_prompt = f"""Generate a detailed, professional Request for Quote (RFQ) based on the following scope of work:
+# Max number of RFQ completions kept in the in-process cache
+RFQ_CACHE_MAX_ENTRIES = 256
 
-**SCOPE INPUT:** {scope_description}
+RFQ_MODEL = "gpt-4o"  # Use latest model
+RFQ_TEMPERATURE = 0.3  # Lower temperature for more consistent, professional output
+RFQ_MAX_TOKENS = 2000
+
+# Batch API polling (batches complete within a 24h window)
+BATCH_POLL_INITIAL_SECONDS = 10
+BATCH_POLL_MAX_SECONDS = 300
+BATCH_TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+# Shared connection pool so repeated calls reuse TCP/TLS sessions
+HTTP_LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=50)
+# The SDK adopts a custom client's timeout; keep its 600s default for reads, since
+# non-streamed 2000-token completions can run past a minute
+HTTP_TIMEOUT = httpx.Timeout(600.0, connect=5.0)
 
-Create a comprehensive RFQ that includes:
+# Static RFQ instructions. Keep this byte-identical across calls (no dates,
+# IDs or scope text) so OpenAI's automatic prompt caching can reuse it once
+# the shared prefix passes the 1024-token threshold.
+RFQ_SYSTEM_PROMPT = """You are an expert construction project manager and procurement specialist with 20+ years of experience writing Request for Quotes (RFQs) for commercial and residential construction projects. Your task is to transform brief scope descriptions into comprehensive, professional RFQs that will get accurate, competitive bids from qualified contractors.
+
+For every scope of work you receive, create a comprehensive RFQ that includes:
 
 ### 1. DETAILED SCOPE EXPANSION
 - Break down each scope item into specific, measurable tasks
@@ -82,35 +95,230 @@ Create a comprehensive RFQ that includes:
 - Professional and businesslike
 - Clear and unambiguous
 - Detailed enough to prevent misunderstandings
-- Fair and reasonable in requirements
+- Fair and reasonable in requirements"""
+
+class AIRFQGenerator:
+    def __init__(self):
+        # Get OpenAI API key from environment
+        self.openai_api_key = os.getenv('OPENAI_API_KEY')
+        if self.openai_api_key:
+            openai.api_key = self.openai_api_key
+        
+        # LRU cache of completed RFQs keyed by prompt hash
+        self._completion_cache: "OrderedDict[str, str]" = OrderedDict()
+        
+        # OpenAI clients are created on first use and reused across requests
+        self._client = None
+        self._async_client = None
+    
+    def _get_client(self):
+        if self._client is None:
+            self._client = openai.OpenAI(
+                api_key=self.openai_api_key,
+                http_client=httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+            )
+        return self._client
+    
+    def _get_async_client(self):
+        if self._async_client is None:
+            self._async_client = openai.AsyncOpenAI(
+                api_key=self.openai_api_key,
+                http_client=httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+            )
+        return self._async_client
+    
+    async def aclose(self) -> None:
+        """Close pooled connections (call on application shutdown)"""
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+    
+    def _cache_key(self, model: str, temperature: float, system_prompt: str, user_prompt: str) -> str:
+        """Hash everything that determines the completion"""
+        raw = f"{model}|{temperature}|{system_prompt}|{user_prompt}"
+        return hashlib.blake2b(raw.encode('utf-8')).hexdigest()
+    
+    def _cache_get(self, key: str) -> Optional[str]:
+        text = self._completion_cache.get(key)
+        if text is not None:
+            self._completion_cache.move_to_end(key)
+        return text
+    
+    def _cache_set(self, key: str, text: str) -> None:
+        self._completion_cache[key] = text
+        self._completion_cache.move_to_end(key)
+        while len(self._completion_cache) > RFQ_CACHE_MAX_ENTRIES:
+            self._completion_cache.popitem(last=False)
+    
+    def _build_prompts(self, scope_description: str) -> Tuple[str, str]:
+        """Build the (system, user) prompt pair for a scope description"""
+        
+        # Only the scope varies per call; everything static lives in RFQ_SYSTEM_PROMPT
+        user_prompt = f"""Generate a detailed, professional Request for Quote (RFQ) based on the following scope of work:
+
+**SCOPE INPUT:** {scope_description}
 
 Generate the complete RFQ now:"""
 
+        return RFQ_SYSTEM_PROMPT, user_prompt
+    
+    def _build_request_body(self, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
+        """Chat completion request body shared by the interactive and batch paths"""
+        # The static system prompt goes first so it forms the cacheable prefix
+        return {
+            "model": RFQ_MODEL,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "max_tokens": RFQ_MAX_TOKENS,
+            "temperature": RFQ_TEMPERATURE
+        }
+    
+    def generate_rfq(self, scope_description: str, project_context: Optional[Dict[str, Any]] = None) -> str:
+        """Generate professional RFQ from scope description using OpenAI"""
+        
+        system_prompt, user_prompt = self._build_prompts(scope_description)
+        
         try:
             if not self.openai_api_key:
                 # Return enhanced mock if no API key
                 return self._generate_mock_enhancement(scope_description)
             
-            from openai import OpenAI
-            client = OpenAI(api_key=self.openai_api_key)
+            # Identical scopes (boilerplate RFQs) skip the OpenAI round-trip
+            cache_key = self._cache_key(RFQ_MODEL, RFQ_TEMPERATURE, system_prompt, user_prompt)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
             
-            response = client.chat.completions.create(
-                model="gpt-4o",  # Use latest model
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                max_tokens=2000,
-                temperature=0.3  # Lower temperature for more consistent, professional output
+            response = self._get_client().chat.completions.create(
+                **self._build_request_body(system_prompt, user_prompt)
             )
             
-            return response.choices[0].message.content.strip()
+            text = response.choices[0].message.content.strip()
+            self._cache_set(cache_key, text)
+            return text
             
         except Exception as e:
             print(f"OpenAI API error: {e}")
             # Fallback to enhanced mock
             return self._generate_mock_enhancement(scope_description)
     
+    async def generate_rfq_async(self, scope_description: str, project_context: Optional[Dict[str, Any]] = None) -> str:
+        """Async variant of generate_rfq for use from request handlers"""
+        
+        system_prompt, user_prompt = self._build_prompts(scope_description)
+        
+        try:
+            if not self.openai_api_key:
+                # Return enhanced mock if no API key
+                return self._generate_mock_enhancement(scope_description)
+            
+            cache_key = self._cache_key(RFQ_MODEL, RFQ_TEMPERATURE, system_prompt, user_prompt)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                return cached
+            
+            response = await self._get_async_client().chat.completions.create(
+                **self._build_request_body(system_prompt, user_prompt)
+            )
+            
+            text = response.choices[0].message.content.strip()
+            self._cache_set(cache_key, text)
+            return text
+            
+        except Exception as e:
+            print(f"OpenAI API error: {e}")
+            # Fallback to enhanced mock
+            return self._generate_mock_enhancement(scope_description)
+    
+    def submit_batch(self, scopes: List[str]) -> str:
+        """Upload RFQ requests for the given scopes to the OpenAI Batch API and return the batch id"""
+        if not self.openai_api_key:
+            raise Exception("OpenAI API key is required for batch RFQ generation")
+        
+        lines = []
+        for i, scope_description in enumerate(scopes):
+            system_prompt, user_prompt = self._build_prompts(scope_description)
+            lines.append(json.dumps({
+                "custom_id": f"rfq-{i}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": self._build_request_body(system_prompt, user_prompt)
+            }))
+        
+        client = self._get_client()
+        
+        buf = io.BytesIO("\n".join(lines).encode('utf-8'))
+        buf.name = "rfq_batch.jsonl"
+        input_file = client.files.create(file=buf, purpose="batch")
+        
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        print(f"Submitted RFQ batch {batch.id} with {len(scopes)} requests")
+        return batch.id
+    
+    def wait_for_batch(self, batch_id: str, timeout_seconds: Optional[float] = None) -> Dict[str, str]:
+        """Poll a batch until it finishes and return RFQ text keyed by custom_id"""
+        client = self._get_client()
+        
+        started = time.monotonic()
+        delay = BATCH_POLL_INITIAL_SECONDS
+        batch = client.batches.retrieve(batch_id)
+        while batch.status not in BATCH_TERMINAL_STATUSES:
+            if timeout_seconds is not None and time.monotonic() - started > timeout_seconds:
+                raise Exception(f"Timed out waiting for RFQ batch {batch_id} (status: {batch.status})")
+            time.sleep(delay)
+            delay = min(delay * 2, BATCH_POLL_MAX_SECONDS)
+            batch = client.batches.retrieve(batch_id)
+        
+        if batch.status != 'completed':
+            raise Exception(f"RFQ batch {batch_id} ended with status: {batch.status}")
+        
+        results = {}
+        if not batch.output_file_id:
+            return results
+        
+        output = client.files.content(batch.output_file_id).text
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get('response') or {}
+            if response.get('status_code') != 200:
+                print(f"RFQ batch request {record.get('custom_id')} failed: {record.get('error')}")
+                continue
+            results[record['custom_id']] = response['body']['choices'][0]['message']['content'].strip()
+        
+        return results
+    
+    def generate_rfqs_via_batch_api(self, scopes: List[str], timeout_seconds: Optional[float] = None) -> List[str]:
+        """Generate RFQs for many scopes through the Batch API (non-interactive, half the token cost)"""
+        if not self.openai_api_key:
+            return [self._generate_mock_enhancement(scope) for scope in scopes]
+        
+        batch_id = self.submit_batch(scopes)
+        results = self.wait_for_batch(batch_id, timeout_seconds)
+        
+        rfqs = []
+        for i, scope_description in enumerate(scopes):
+            text = results.get(f"rfq-{i}")
+            if text is None:
+                # Fall back for requests that failed inside the batch
+                text = self._generate_mock_enhancement(scope_description)
+            else:
+                system_prompt, user_prompt = self._build_prompts(scope_description)
+                self._cache_set(self._cache_key(RFQ_MODEL, RFQ_TEMPERATURE, system_prompt, user_prompt), text)
+            rfqs.append(text)
+        
+        return rfqs
+    
     def _generate_mock_enhancement(self, scope_description: str) -> str:
         """Generate enhanced scope using rule-based logic when OpenAI is unavailable"""
         
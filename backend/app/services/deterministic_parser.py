@@ -1,8 +1,64 @@
 import pandas as pd
+import numpy as np
 import re
 import json
+import logging
+import itertools
 from typing import Dict, List, Any, Optional
+from openpyxl import load_workbook
 
+from .excel_parser import NA_STRINGS
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib encoder
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+
+# Compiled once at import - these run for every row of the sheet
+_DIV_CODE_RE = re.compile(r'^\d{1,2}$')
+_SUBCAT_RE = re.compile(r'^\d{4}\s*-\s*.+')
+# Summary rows to skip (case-insensitive, end-anchored), as a single alternation
+_SKIP_RE = re.compile(
+    r'(?:subtotal|job total|payment terms|accepted by|terms|warranty'
+    r'|allowance total|division total|section total|category total'
+    r'|overhead|profit|contingency|fee'
+    r'|total|sum|amount due'
+    r'|notes?|assumptions?|exclusions?)$'
+    r'|^footings?$',  # Skip standalone "Footings" entries
+    re.IGNORECASE
+)
+_CURRENCY_STRIP_RE = re.compile(r'[^\d.-]')
+_SLUG_NONALNUM_RE = re.compile(r'[^a-zA-Z0-9\s]')
+_SLUG_WS_RE = re.compile(r'\s+')
+# ASCII equivalent of _SLUG_NONALNUM_RE: delete everything but letters, digits, whitespace
+_SLUG_DELETE_TABLE = str.maketrans('', '', ''.join(
+    c for c in map(chr, range(128)) if not (c.isalnum() or c.isspace())
+))
+
+# Standard units map to themselves, common variations to their standard unit
+_UNIT_TABLE = {u: u for u in ('EA', 'LF', 'SF', 'SY', 'CY', 'HR', 'LS', 'MO')}
+_UNIT_TABLE.update({
+    'EACH': 'EA',
+    'LINEAR': 'LF',
+    'LINEAL': 'LF',
+    'SQUARE': 'SF',
+    'SQ': 'SF',
+    'CUBIC': 'CY',
+    'HOUR': 'HR',
+    'HOURS': 'HR',
+    'LUMP': 'LS',
+    'MONTH': 'MO',
+    'MONTHS': 'MO'
+})
+
+_PACK_ITEM_FMT = (
+    '- [row={row}] "{desc}" | qty={qty} | unit={unit} | '
+    'material={material:.2f} | labor={labor:.2f} | subequip={subequip:.2f} | '
+    'total={total:.2f} | scope={scope} | est={est}'
+)
 
 def parse_estimate_xlsx(xlsx_path: str, sheet_name: str = None) -> dict:
     """Implements the steps above and returns the project-level JSON."""
@@ -10,34 +66,44 @@ def parse_estimate_xlsx(xlsx_path: str, sheet_name: str = None) -> dict:
     # Auto-detect sheet if not provided
     if sheet_name is None:
         sheet_name = _find_estimate_sheet(xlsx_path)
-        print(f"Auto-detected estimate sheet: '{sheet_name}'")
+        logger.info("Auto-detected estimate sheet: '%s'", sheet_name)
+    
+    # Step 1 — Read into a plain object array ('' for empty cells); indexing
+    # it directly avoids pandas .iloc per cell on sheets with thousands of rows
+    arr = _read_sheet_values(xlsx_path, sheet_name)
+    col_c = [str(v).strip() for v in arr[:, 2]]
     
-    # Step 1 — Read
-    df = pd.read_excel(xlsx_path, sheet_name=sheet_name, header=None)
-    df = df.fillna('')
+    # Parse the numeric columns in one vectorized pass each
+    qty_d = _parse_number_column(arr[:, 3])             # D
+    material_h = _parse_currency_column(arr[:, 7])      # H
+    labor_j = _parse_currency_column(arr[:, 9])         # J
+    subequip_l = _parse_currency_column(arr[:, 11])     # L
+    total_m = _parse_currency_column(arr[:, 12])        # M
+    unit_e = _normalize_unit_column(arr[:, 4])          # E
     
-    # Step 2 — Find bottom summary rows (scan upward in column C)
+    # Step 2 — Find bottom summary rows (last match in column C)
     project_subtotal_raw = None
-    project_subtotal_idx = None
     overhead_profit_raw = None
     job_total_raw = None
     
-    # Scan from bottom up
-    for i in range(len(df) - 1, -1, -1):
-        desc = str(df.iloc[i, 2]).strip().lower()
-        
-        if 'project subtotal' in desc and project_subtotal_raw is None:
-            project_subtotal_raw = _parse_currency(df.iloc[i, 12])
-            project_subtotal_idx = i
-            print(f"Found Project Subtotal at row {i}: ${project_subtotal_raw}")
-        
-        if 'overhead' in desc and 'profit' in desc and overhead_profit_raw is None:
-            overhead_profit_raw = _parse_currency(df.iloc[i, 12])
-            print(f"Found Overhead & Profit at row {i}: ${overhead_profit_raw}")
-        
-        if 'job total' in desc and job_total_raw is None:
-            job_total_raw = _parse_currency(df.iloc[i, 12])
-            print(f"Found Job Total at row {i}: ${job_total_raw}")
+    desc_lower = pd.Series(col_c, dtype=object).str.lower()
+    project_subtotal_idx = _last_match(desc_lower.str.contains('project subtotal', regex=False))
+    overhead_profit_idx = _last_match(
+        desc_lower.str.contains('overhead', regex=False) & desc_lower.str.contains('profit', regex=False)
+    )
+    job_total_idx = _last_match(desc_lower.str.contains('job total', regex=False))
+    
+    if project_subtotal_idx is not None:
+        project_subtotal_raw = total_m[project_subtotal_idx]
+        logger.info("Found Project Subtotal at row %s: $%s", project_subtotal_idx, project_subtotal_raw)
+    
+    if overhead_profit_idx is not None:
+        overhead_profit_raw = total_m[overhead_profit_idx]
+        logger.info("Found Overhead & Profit at row %s: $%s", overhead_profit_idx, overhead_profit_raw)
+    
+    if job_total_idx is not None:
+        job_total_raw = total_m[job_total_idx]
+        logger.info("Found Job Total at row %s: $%s", job_total_idx, job_total_raw)
     
     if project_subtotal_idx is None:
         raise Exception("Could not find Project Subtotal row")
@@ -46,32 +112,48 @@ def parse_estimate_xlsx(xlsx_path: str, sheet_name: str = None) -> dict:
     divisions = []
     current_division = None
     current_subcategory = None
+    grand_total_from_items = 0.0  # Accumulated as divisions close
+    
+    # Classify every row up front; only division/subcategory headers, subtotal
+    # rows and costed non-summary lines can change parser state
+    col_c_arr = np.array(col_c, dtype=object)
+    is_division_row = _str_column(arr[:, 0]).str.match(_DIV_CODE_RE).to_numpy(dtype=bool)
+    is_subcategory_row = _str_column(arr[:, 1]).str.match(_SUBCAT_RE).to_numpy(dtype=bool)
+    is_subtotal_row = desc_lower.str.contains('subtotal', regex=False).to_numpy(dtype=bool)
+    is_skip_row = pd.Series(col_c, dtype=object).str.contains(_SKIP_RE).to_numpy(dtype=bool)
+    has_cost = (
+        (np.array(material_h) > 0) | (np.array(labor_j) > 0) |
+        (np.array(subequip_l) > 0) | (np.array(total_m) > 0)
+    )
+    is_item_row = (col_c_arr != '') & (col_c_arr != 'nan') & ~is_skip_row & has_cost
+    is_relevant = is_division_row | is_subcategory_row | is_subtotal_row | is_item_row
     
-    # Iterate rows from 6 to project_subtotal_idx - 1
-    for row_idx in range(6, project_subtotal_idx):
-        row = df.iloc[row_idx]
+    # Visit the relevant rows from 6 to project_subtotal_idx - 1
+    for row_idx in (np.flatnonzero(is_relevant[6:project_subtotal_idx]) + 6).tolist():
+        row = arr[row_idx]
         
         # Division detection: when column A is 1–2 digit int
-        div_code_raw = str(row.iloc[0]).strip()
-        if re.match(r'^\d{1,2}$', div_code_raw):
-            division_name = str(row.iloc[2]).strip()
+        div_code_raw = str(row[0]).strip()
+        if is_division_row[row_idx]:
+            division_name = col_c[row_idx]
             
             # Check if this is a subtotal row for the current division
             if (current_division and 
                 current_division['divisionCode'] == div_code_raw.zfill(2) and 
                 'subtotal' in division_name.lower()):
                 # This is the subtotal row for the current division
-                subtotal_amount = _parse_currency(row.iloc[12])  # M column
+                subtotal_amount = total_m[row_idx]  # M column
                 if subtotal_amount > 0:
                     current_division['subtotalFound'] = True
                     current_division['subtotalAmount'] = subtotal_amount
-                    print(f"  Found {current_division['divisionName']} Subtotal: ${subtotal_amount:.2f}")
+                    logger.debug("  Found %s Subtotal: $%.2f", current_division['divisionName'], subtotal_amount)
                 continue
             
             # Close previous division if this is a new division (not subtotal)
             if current_division and current_division['items']:
                 _finalize_division(current_division)
                 divisions.append(current_division)
+                grand_total_from_items += current_division['divisionTotal']
             
             # Start new division (skip if this is a subtotal row)
             if 'subtotal' not in division_name.lower():
@@ -82,19 +164,20 @@ def parse_estimate_xlsx(xlsx_path: str, sheet_name: str = None) -> dict:
                     'subcategories': {},  # Will hold subcategory groupings
                     'items': [],  # Flat list for backward compatibility
                     'subtotalFound': False,
-                    'subtotalAmount': 0.0
+                    'subtotalAmount': 0.0,
+                    '_runningTotal': 0.0  # Item totals, summed as items are added
                 }
                 current_subcategory = None
-                print(f"Started Division {division_code}: {division_name}")
+                logger.debug("Started Division %s: %s", division_code, division_name)
             continue
         
         # Subcategory detection: when column B has pattern like "1100 - Permit"
-        subcat_code_raw = str(row.iloc[1]).strip()
-        if subcat_code_raw and subcat_code_raw != 'nan':
-            print(f"  DEBUG Row {row_idx} Col B: '{subcat_code_raw}' (type: {type(row.iloc[1])})")
+        subcat_code_raw = str(row[1]).strip()
+        if subcat_code_raw and subcat_code_raw != 'nan' and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("  Row %s Col B: '%s' (type: %s)", row_idx, subcat_code_raw, type(row[1]))
         
         # Match pattern "1100 - Description" to detect subcategory headers
-        if re.match(r'^\d{4}\s*-\s*.+', subcat_code_raw) and current_division:
+        if is_subcategory_row[row_idx] and current_division:
             # This is a subcategory header - use the full string as the subcategory name
             current_subcategory = {
                 'subcategoryCode': subcat_code_raw.split(' - ')[0],  # Just the code part for ID
@@ -104,22 +187,22 @@ def parse_estimate_xlsx(xlsx_path: str, sheet_name: str = None) -> dict:
             
             # Store subcategory in division
             current_division['subcategories'][current_subcategory['subcategoryCode']] = current_subcategory
-            print(f"  Started Subcategory {current_subcategory['subcategoryCode']}: {subcat_code_raw}")
+            logger.debug("  Started Subcategory %s: %s", current_subcategory['subcategoryCode'], subcat_code_raw)
             continue
         
         # Get description early for all checks
-        description = str(row.iloc[2]).strip()
+        description = col_c[row_idx]
         
         # Look for division subtotal rows (e.g., "General Conditions Subtotal")
         if current_division and 'subtotal' in description.lower():
             # Check if this matches the current division name + "subtotal"
             division_name_lower = current_division['divisionName'].lower()
             if division_name_lower in description.lower():
-                subtotal_amount = _parse_currency(row.iloc[12])  # M column
+                subtotal_amount = total_m[row_idx]  # M column
                 if subtotal_amount > 0:
                     current_division['subtotalFound'] = True
                     current_division['subtotalAmount'] = subtotal_amount
-                    print(f"  Found {current_division['divisionName']} Subtotal: ${subtotal_amount:.2f}")
+                    logger.debug("  Found %s Subtotal: $%.2f", current_division['divisionName'], subtotal_amount)
                 continue
         
         # Skip if no current division
@@ -131,36 +214,29 @@ def parse_estimate_xlsx(xlsx_path: str, sheet_name: str = None) -> dict:
             continue
         
         # Skip summary rows (case-insensitive, end-anchored) - expanded patterns
-        skip_patterns = [
-            r'(subtotal|job total|payment terms|accepted by|terms|warranty)$',
-            r'(allowance total|division total|section total|category total)$', 
-            r'(overhead|profit|contingency|fee)$',
-            r'(total|sum|amount due)$',
-            r'(notes?|assumptions?|exclusions?)$',
-            r'^footings?$'  # Skip standalone "Footings" entries
-        ]
-        if any(re.search(pattern, description, re.IGNORECASE) for pattern in skip_patterns):
+        if is_skip_row[row_idx]:
             continue
         
         # Extract costs
-        material_cost = _parse_currency(row.iloc[7])  # H
-        labor_cost = _parse_currency(row.iloc[9])     # J
-        subequip_cost = _parse_currency(row.iloc[11]) # L
-        total_cost = _parse_currency(row.iloc[12])    # M
+        material_cost = material_h[row_idx]  # H
+        labor_cost = labor_j[row_idx]        # J
+        subequip_cost = subequip_l[row_idx]  # L
+        total_cost = total_m[row_idx]        # M
         
         # Include if any cost > 0
         if material_cost > 0 or labor_cost > 0 or subequip_cost > 0 or total_cost > 0:
             # Calculate total
             calc_total = total_cost if total_cost > 0 else (material_cost + labor_cost + subequip_cost)
             
-            # DEBUG: Log exactly which row is being processed
-            print(f"  DEBUG Row {row_idx}: '{description}' - M=${total_cost}, H=${material_cost}, J=${labor_cost}, L=${subequip_cost}")
+            # Log exactly which row is being processed
+            logger.debug("  Row %s: '%s' - M=$%s, H=$%s, J=$%s, L=$%s",
+                         row_idx, description, total_cost, material_cost, labor_cost, subequip_cost)
             
             # Extract other fields
-            quantity = _parse_number(row.iloc[3])  # D
-            unit = _normalize_unit(str(row.iloc[4]).strip())  # E
-            scope_notes = str(row.iloc[13]).strip() if str(row.iloc[13]).strip() != 'nan' else None  # N
-            estimating_notes = str(row.iloc[14]).strip() if str(row.iloc[14]).strip() != 'nan' else None  # O
+            quantity = qty_d[row_idx]  # D
+            unit = unit_e[row_idx]  # E
+            scope_notes = str(row[13]).strip() if str(row[13]).strip() != 'nan' else None  # N
+            estimating_notes = str(row[14]).strip() if str(row[14]).strip() != 'nan' else None  # O
             
             # Build lineId with subcategory if available
             subcat_prefix = f"{current_subcategory['subcategoryCode']}-" if current_subcategory else ""
@@ -178,22 +254,22 @@ def parse_estimate_xlsx(xlsx_path: str, sheet_name: str = None) -> dict:
                 'scopeNotes': scope_notes,
                 'estimatingNotes': estimating_notes,
                 'subcategoryCode': current_subcategory['subcategoryCode'] if current_subcategory else None,
-                'subcategoryName': current_subcategory['subcategoryName'] if current_subcategory else None
+                'subcategoryName': current_subcategory['subcategoryName'] if current_subcategory else None,
+                '_rowIdx': row_idx  # Internal: saves re-parsing lineId in to_division_pack
             }
             
             # Add to both subcategory and division level
             current_division['items'].append(item)
+            current_division['_runningTotal'] += item['totalCost']
             if current_subcategory:
                 current_subcategory['items'].append(item)
-            print(f"  Added item: {description[:40]} - ${calc_total:.2f}")
+            logger.debug("  Added item: %.40s - $%.2f", description, calc_total)
     
     # Step 4 — Close last division, compute totals
     if current_division and current_division['items']:
         _finalize_division(current_division)
         divisions.append(current_division)
-    
-    # Calculate grand total from items
-    grand_total_from_items = sum(div['divisionTotal'] for div in divisions)
+        grand_total_from_items += current_division['divisionTotal']
     
     # Step 5 — Set project totals (match spreadsheet)
     project_subtotal = project_subtotal_raw or 0.0
@@ -204,12 +280,12 @@ def parse_estimate_xlsx(xlsx_path: str, sheet_name: str = None) -> dict:
     if abs(project_subtotal - grand_total_from_items) > 0.01:
         raise Exception(f"Parsed items don't reconcile with Project Subtotal: {grand_total_from_items:.2f} vs {project_subtotal:.2f}")
     
-    print(f"✅ Reconciliation passed: ${grand_total_from_items:.2f} ≈ ${project_subtotal:.2f}")
+    logger.info("✅ Reconciliation passed: $%.2f ≈ $%.2f", grand_total_from_items, project_subtotal)
     
     # Step 6 — Meta
-    client = str(df.iloc[0, 2]).strip() if str(df.iloc[0, 2]).strip() != 'nan' else None
-    project = str(df.iloc[1, 2]).strip() if str(df.iloc[1, 2]).strip() != 'nan' else None
-    date = str(df.iloc[2, 2]).strip() if str(df.iloc[2, 2]).strip() != 'nan' else None
+    client = col_c[0] if col_c[0] != 'nan' else None
+    project = col_c[1] if col_c[1] != 'nan' else None
+    date = col_c[2] if col_c[2] != 'nan' else None
     
     # Step 7 — Return JSON exactly in the schema
     result = {
@@ -225,7 +301,7 @@ def parse_estimate_xlsx(xlsx_path: str, sheet_name: str = None) -> dict:
         "grandTotalFromItems": round(grand_total_from_items, 2)
     }
     
-    print(f"Parser complete: {len(divisions)} divisions, ${grand_total_from_items:.2f} total")
+    logger.info("Parser complete: %d divisions, $%.2f total", len(divisions), grand_total_from_items)
     return result
 
 
@@ -243,149 +319,212 @@ def to_division_pack(division: dict) -> str:
     if not division.get('items'):
         return ""
     
-    lines = [
+    header = (
         f"DIVISION_CODE: {division['divisionCode']}",
         f"DIVISION_NAME: {division['divisionName']}",
         "ROWS:"
-    ]
+    )
+    return '\n'.join(itertools.chain(header, map(_format_pack_item, division['items'])))
+
+
+def strip_private_fields(data):
+    """Copy of the parser output without internal '_'-prefixed keys"""
+    if isinstance(data, dict):
+        return {k: strip_private_fields(v) for k, v in data.items() if not k.startswith('_')}
+    if isinstance(data, list):
+        return [strip_private_fields(v) for v in data]
+    return data
+
+
+def save_project_json(data: dict, out_path: str) -> None:
+    """Write pretty-printed JSON to disk.
     
-    for item in division['items']:
+    Streams one top-level value (and one division) at a time so peak memory
+    stays at a single division's encoded size, not the whole document.
+    """
+    with open(out_path, 'wb') as f:
+        f.write(b'{')
+        first = True
+        for key, value in data.items():
+            if key.startswith('_'):
+                continue
+            f.write(b'' if first else b',')
+            f.write(b'\n  ' + _json_bytes(key) + b': ')
+            first = False
+            
+            if isinstance(value, list) and value:
+                f.write(b'[')
+                for i, element in enumerate(value):
+                    f.write(b'' if i == 0 else b',')
+                    f.write(b'\n    ' + _indent_json(_json_bytes(strip_private_fields(element)), 4))
+                f.write(b'\n  ]')
+            else:
+                f.write(_indent_json(_json_bytes(strip_private_fields(value)), 2))
+        f.write(b'}' if first else b'\n}')
+    logger.info("Saved project JSON to: %s", out_path)
+
+
+# Helper functions
+def _json_bytes(value) -> bytes:
+    """Pretty-printed (indent=2) UTF-8 JSON for one value"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_INDENT_2)
+    return json.dumps(value, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def _indent_json(encoded: bytes, spaces: int) -> bytes:
+    """Shift continuation lines of an encoded value to its nesting depth"""
+    # JSON strings never contain raw newlines, so every newline is structural
+    return encoded.replace(b'\n', b'\n' + b' ' * spaces)
+
+
+def _format_pack_item(item: dict) -> str:
+    """One ROWS line of a division pack"""
+    row = item.get('_rowIdx')
+    if row is None:
         # Extract row number from lineId (last part after final dash)
         line_id = item['lineId']
-        row_num = line_id.split('-')[-1] if '-' in line_id else 'unknown'
-        
-        # Format values, handling None
-        qty = item['quantity'] if item['quantity'] is not None else 'null'
-        unit = f'"{item["unit"]}"' if item['unit'] else 'null'
-        scope = f'"{item["scopeNotes"]}"' if item['scopeNotes'] else 'null'
-        est = f'"{item["estimatingNotes"]}"' if item['estimatingNotes'] else 'null'
-        
-        line = (
-            f'- [row={row_num}] "{item["tradeDescription"]}" | '
-            f'qty={qty} | unit={unit} | '
-            f'material={item["materialCost"]:.2f} | '
-            f'labor={item["laborCost"]:.2f} | '
-            f'subequip={item["subEquipCost"]:.2f} | '
-            f'total={item["totalCost"]:.2f} | '
-            f'scope={scope} | est={est}'
-        )
-        lines.append(line)
+        row = line_id.split('-')[-1] if '-' in line_id else 'unknown'
     
-    return '\n'.join(lines)
+    return _PACK_ITEM_FMT.format(
+        row=row,
+        desc=item['tradeDescription'],
+        qty=item['quantity'] if item['quantity'] is not None else 'null',
+        unit=f'"{item["unit"]}"' if item['unit'] else 'null',
+        material=item['materialCost'],
+        labor=item['laborCost'],
+        subequip=item['subEquipCost'],
+        total=item['totalCost'],
+        scope=f'"{item["scopeNotes"]}"' if item['scopeNotes'] else 'null',
+        est=f'"{item["estimatingNotes"]}"' if item['estimatingNotes'] else 'null'
+    )
 
 
-def save_project_json(data: dict, out_path: str) -> None:
-    """Write pretty-printed JSON to disk."""
-    with open(out_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
-    print(f"Saved project JSON to: {out_path}")
+def _read_sheet_values(xlsx_path: str, sheet_name: str) -> np.ndarray:
+    """Stream a worksheet's cell values into a 2D object array, '' for empty cells"""
+    wb = load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        rows = [
+            tuple(_cell_value(value) for value in row)
+            for row in wb[sheet_name].iter_rows(values_only=True)
+        ]
+    finally:
+        wb.close()
+    
+    # Drop trailing blank rows (read-only mode reports styled-but-empty rows)
+    while rows and all(value == '' for value in rows[-1]):
+        rows.pop()
+    
+    width = max((len(row) for row in rows), default=0)
+    arr = np.full((len(rows), width), '', dtype=object)
+    for i, row in enumerate(rows):
+        arr[i, :len(row)] = row
+    return arr
+
+
+def _cell_value(value):
+    """Match pd.read_excel(...).fillna(''): None and pandas' NA strings -> '', whole floats -> int"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and value in NA_STRINGS:
+        return ''
+    return value
 
 
-# Helper functions
 def _finalize_division(division: dict) -> None:
     """Calculate division total - use subtotal if found, otherwise sum items"""
     if division.get('subtotalFound') and division.get('subtotalAmount', 0) > 0:
         # Use the official subtotal from Excel
         division['divisionTotal'] = round(division['subtotalAmount'], 2)
-        print(f"  Division {division['divisionCode']} total: ${division['subtotalAmount']:.2f} (from subtotal row, {len(division['items'])} items)")
+        logger.debug("  Division %s total: $%.2f (from subtotal row, %d items)",
+                     division['divisionCode'], division['subtotalAmount'], len(division['items']))
     else:
-        # Fallback to summing items
-        division_total = sum(item['totalCost'] for item in division['items'])
+        # Fallback to the item total accumulated during the parse
+        division_total = division['_runningTotal']
         division['divisionTotal'] = round(division_total, 2)
-        print(f"  Division {division['divisionCode']} total: ${division_total:.2f} (calculated from {len(division['items'])} items)")
+        logger.debug("  Division %s total: $%.2f (calculated from %d items)",
+                     division['divisionCode'], division_total, len(division['items']))
     
     # Remove the tracking fields
     division.pop('subtotalFound', None)
     division.pop('subtotalAmount', None)
+    division.pop('_runningTotal', None)
 
 
-def _parse_currency(value) -> float:
-    """Convert currency text to float"""
-    if pd.isna(value) or value == '':
-        return 0.0
-    
-    try:
-        # Remove currency symbols and commas
-        clean_str = re.sub(r'[^\d.-]', '', str(value))
-        return float(clean_str) if clean_str else 0.0
-    except:
-        return 0.0
+def _str_column(values) -> pd.Series:
+    """Column of cell values as stripped strings"""
+    return pd.Series(values, dtype=object).astype(str).str.strip()
 
 
-def _parse_number(value) -> Optional[float]:
-    """Convert number text to float, return None if empty"""
-    if pd.isna(value) or value == '' or str(value).strip() == 'nan':
-        return None
-    
-    try:
-        return float(str(value).strip())
-    except:
-        return None
+def _last_match(mask: pd.Series) -> Optional[int]:
+    """Position of the last True in a boolean mask, or None"""
+    positions = np.flatnonzero(mask.to_numpy(dtype=bool))
+    return int(positions[-1]) if len(positions) else None
 
 
-def _normalize_unit(unit: str) -> Optional[str]:
-    """Normalize units to standard set"""
-    if not unit or unit == 'nan':
-        return None
-    
-    unit_upper = unit.upper()
-    valid_units = ['EA', 'LF', 'SF', 'SY', 'CY', 'HR', 'LS', 'MO']
-    
-    # Direct match
-    if unit_upper in valid_units:
-        return unit_upper
-    
-    # Common variations
-    unit_map = {
-        'EACH': 'EA',
-        'LINEAR': 'LF',
-        'LINEAL': 'LF',
-        'SQUARE': 'SF',
-        'SQ': 'SF',
-        'CUBIC': 'CY',
-        'HOUR': 'HR',
-        'HOURS': 'HR',
-        'LUMP': 'LS',
-        'MONTH': 'MO',
-        'MONTHS': 'MO'
-    }
-    
-    return unit_map.get(unit_upper, None)
+def _parse_currency_column(values) -> List[float]:
+    """Convert a column of currency text to floats (0.0 when blank or unparseable)"""
+    # Remove currency symbols and commas
+    clean = pd.Series(values, dtype=object).astype(str).str.replace(_CURRENCY_STRIP_RE, '', regex=True)
+    return pd.to_numeric(clean, errors='coerce').fillna(0.0).to_numpy(dtype=float).tolist()
+
+
+def _parse_number_column(values) -> List[Optional[float]]:
+    """Convert a column of number text to floats, None where empty or unparseable"""
+    clean = pd.Series(values, dtype=object).astype(str).str.strip()
+    numbers = pd.to_numeric(clean, errors='coerce').to_numpy(dtype=float).tolist()
+    return [None if n != n else n for n in numbers]  # NaN -> None
+
+
+def _normalize_unit_column(values) -> List[Optional[str]]:
+    """Normalize a column of units to the standard set, None when unrecognized"""
+    units = pd.Series(values, dtype=object).astype(str).str.strip().str.upper().map(_UNIT_TABLE)
+    return [u if isinstance(u, str) else None for u in units]
 
 
 def _slugify(text: str) -> str:
     """Convert text to URL-safe slug"""
+    if text.isascii():
+        # Fast path: one C-level translate pass, split() collapses whitespace
+        return '-'.join(text.lower().translate(_SLUG_DELETE_TABLE).split())
+    
     # Convert to lowercase and replace non-alphanumeric with hyphens
-    slug = re.sub(r'[^a-zA-Z0-9\s]', '', text.lower())
-    slug = re.sub(r'\s+', '-', slug.strip())
+    slug = _SLUG_NONALNUM_RE.sub('', text.lower())
+    slug = _SLUG_WS_RE.sub('-', slug.strip())
     return slug
 
 
 def _find_estimate_sheet(xlsx_path: str) -> str:
     """Auto-detect the estimate worksheet"""
-    excel_file = pd.ExcelFile(xlsx_path)
+    wb = load_workbook(xlsx_path, read_only=True)
+    try:
+        sheet_names = wb.sheetnames
+    finally:
+        wb.close()
     
     # Look for sheets with "estimate" in the name (case-insensitive)
     estimate_sheets = []
-    for sheet_name in excel_file.sheet_names:
+    for sheet_name in sheet_names:
         if 'estimate' in sheet_name.lower():
             estimate_sheets.append(sheet_name)
     
     if estimate_sheets:
         # If multiple estimate sheets, prefer the first one
         selected = estimate_sheets[0]
-        print(f"Found estimate sheets: {estimate_sheets}, selected: '{selected}'")
+        logger.info("Found estimate sheets: %s, selected: '%s'", estimate_sheets, selected)
         return selected
     
     # Fallback: look for sheets with construction keywords
     keywords = ['budget', 'cost', 'summary', 'bid', 'quote']
-    for sheet_name in excel_file.sheet_names:
+    for sheet_name in sheet_names:
         sheet_lower = sheet_name.lower()
         if any(keyword in sheet_lower for keyword in keywords):
-            print(f"Using fallback sheet with construction keyword: '{sheet_name}'")
+            logger.info("Using fallback sheet with construction keyword: '%s'", sheet_name)
             return sheet_name
     
     # Last resort: use first sheet
-    first_sheet = excel_file.sheet_names[0]
-    print(f"No estimate sheet found, using first sheet: '{first_sheet}'")
+    first_sheet = sheet_names[0]
+    logger.info("No estimate sheet found, using first sheet: '%s'", first_sheet)
     return first_sheet
\ No newline at end of file
@@ -1,25 +1,128 @@
+import asyncio
+import hashlib
 import pandas as pd
+import numpy as np
 import io
 import re
 import json
-from typing import Dict, List, Any, Optional
-from openai import OpenAI
+import logging
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional, Tuple
+from openai import AsyncOpenAI
+from openpyxl import load_workbook
 import os
 
+from .excel_parser import NA_STRINGS
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib decoder
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# Compiled once at import and reused for every cell
+_DIV_RE = re.compile(r'^(\d{2})(?:\s*-|\s+)')  # "01 - General Conditions", "02 Site Work"
+_CUR_RE = re.compile(r'^\$?[\d,]+\.?\d*$')
+_CUR_STRIP = re.compile(r'[^\d.-]')
+
+# Columns emitted per line item in a division pack, in header order
+_PACK_HEADER = "Row,A_Division,C_Description,D_Qty,E_Unit,F_Material,I_Labor,K_SubEquip,L_Total,N_Scope,O_Notes"
+# Spreadsheet columns kept for each line item, keyed by column letter
+_LINE_ITEM_COLUMNS = {
+    'A': 0,
+    'C': 2,     # Description
+    'D': 3,     # Quantity
+    'E': 4,     # Unit
+    'F': 5,     # Material
+    'I': 8,     # Labor
+    'K': 10,    # Sub/Equip
+    'L': 11,    # Total
+    'M': 12,    # Alt Total
+    'N': 13,    # Scope Notes
+    'O': 14,    # Estimating Notes
+}
+
+_PACK_COLUMNS = ['row_number', 'A', 'C', 'D', 'E', 'F', 'I', 'K', 'L', 'N', 'O']
+
+# Max divisions normalized by the model at the same time
+NORMALIZE_CONCURRENCY = 8
+
+# Max normalized division responses kept in the in-process cache
+NORMALIZE_CACHE_MAX_ENTRIES = 512
+
+# Deadline for each streamed attempt; long enough for a full NORMALIZE_MAX_TOKENS reply
+NORMALIZE_TIMEOUT_SECONDS = 120
+
+# Small division packs share one request, up to this many pack characters per request
+BATCH_PACK_MAX_CHARS = 6000
+
+# Completion budget per request: a base plus a per-line-item allowance, capped
+NORMALIZE_BASE_TOKENS = 200
+NORMALIZE_TOKENS_PER_ITEM = 80
+NORMALIZE_MAX_TOKENS = 4000
+
+# Identical on every call so OpenAI can serve it from the prompt-prefix cache;
+# only the division packs go in the user message
+NORMALIZE_SYSTEM_PROMPT = """You are a construction data normalizer. Return only valid JSON, no explanations.
+
+You are a construction estimator. Parse division data into normalized JSON. Each division is given as a block that starts with "DIVISION: <code>".
+
+The data format is: Row,A_Division,C_Description,D_Qty,E_Unit,F_Material,I_Labor,K_SubEquip,L_Total,N_Scope,O_Notes
+
+Rules:
+1. Extract only real cost line items (skip subtotals, headers, blank rows)
+2. For each valid item, create lineId as: divisionCode-slugified-description-rowNumber
+3. Parse quantities from D_Qty, units from E_Unit
+4. Parse costs: F_Material, I_Labor, K_SubEquip, L_Total
+5. Extract scope notes from N_Scope and estimating notes from O_Notes
+6. Use the values exactly as provided - DO NOT recalculate
+
+For a single DIVISION block, return JSON format:
+{
+  "divisionCode": "01",
+  "divisionName": "...",
+  "items": [
+    {
+      "lineId": "01-permit-job-14",
+      "tradeDescription": "Permit - Job",
+      "quantity": 1.0,
+      "unit": "EA",
+      "materialCost": 0.0,
+      "laborCost": 0.0,
+      "subEquipCost": 1020.0,
+      "totalCost": 1020.0,
+      "scopeNotes": "...",
+      "estimatingNotes": "..."
+    }
+  ]
+}
+
+For several DIVISION blocks, return one entry per block keyed by its division code, each in the single-division format:
+{
+  "divisions": {
+    "01": {"divisionCode": "01", "divisionName": "...", "items": [...]},
+    "02": {"divisionCode": "02", "divisionName": "...", "items": [...]}
+  }
+}
+
+Return ONLY the JSON - no explanations."""
+
 class DivisionByDivisionParser:
     """Parse Excel estimate by processing one division at a time to avoid token limits"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.aclient = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        # LRU cache of raw model responses keyed by division pack hash
+        self._response_cache: "OrderedDict[str, str]" = OrderedDict()
     
     def parse_excel_to_base_json(self, file_content: bytes, sheet_name: str) -> Dict[str, Any]:
         """Step 1: Parse Excel with pandas and group by division"""
         try:
             # Read the Excel sheet
-            df = pd.read_excel(io.BytesIO(file_content), sheet_name=sheet_name)
-            df = df.fillna('')
+            df = self._read_sheet_frame(file_content, sheet_name)
             
-            print(f"Processing {len(df)} rows from sheet '{sheet_name}'")
+            logger.info("Processing %d rows from sheet '%s'", len(df), sheet_name)
             
             # Extract meta information from header rows
             meta = self._extract_meta_info(df)
@@ -40,96 +143,125 @@ class DivisionByDivisionParser:
         except Exception as e:
             raise Exception(f"Error parsing Excel to base JSON: {str(e)}")
     
+    def _read_sheet_frame(self, file_content: bytes, sheet_name: str) -> pd.DataFrame:
+        """Stream a worksheet into a string DataFrame, '' for empty cells, first row as header"""
+        wb = load_workbook(io.BytesIO(file_content), read_only=True, data_only=True)
+        try:
+            rows = [
+                [self._cell_text(value) for value in row]
+                for row in wb[sheet_name].iter_rows(values_only=True)
+            ]
+        finally:
+            wb.close()
+        
+        # Drop trailing blank rows (read-only mode reports styled-but-empty rows)
+        while rows and all(value == '' for value in rows[-1]):
+            rows.pop()
+        
+        # Row 1 is the header row, matching pd.read_excel's default
+        width = max((len(row) for row in rows), default=0)
+        body = [row + [''] * (width - len(row)) for row in rows[1:]]
+        return pd.DataFrame(body, columns=range(width), dtype=object)
+    
+    def _cell_text(self, value: Any) -> str:
+        """Match pd.read_excel(dtype=str): '' for empty/NA, whole floats without '.0'"""
+        if value is None:
+            return ''
+        if isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        text = str(value)
+        return '' if text in NA_STRINGS else text
+    
     def _extract_meta_info(self, df: pd.DataFrame) -> Dict[str, Optional[str]]:
         """Extract client, project, date from header rows"""
         meta = {"client": None, "project": None, "date": None}
         
-        # Look in first few rows for meta information
-        for i in range(min(10, len(df))):
-            row = df.iloc[i]
-            for j, cell in enumerate(row):
-                cell_str = str(cell).strip().lower()
-                
-                # Look for client info
-                if 'client' in cell_str and j + 1 < len(row):
-                    meta["client"] = str(row.iloc[j + 1]).strip()
-                
-                # Look for project info  
-                if 'project' in cell_str and j + 1 < len(row):
-                    meta["project"] = str(row.iloc[j + 1]).strip()
-                
-                # Look for date info
-                if 'date' in cell_str and j + 1 < len(row):
-                    meta["date"] = str(row.iloc[j + 1]).strip()
+        # Look in first few rows for meta information; the value sits in the next column
+        head = df.head(10)
+        if head.shape[1] < 2:
+            return meta
+        lowered = head.iloc[:, :-1].astype(str).apply(lambda col: col.str.lower())
+        
+        for label in ('client', 'project', 'date'):
+            hits = lowered.apply(lambda col: col.str.contains(label, regex=False)).to_numpy(dtype=bool)
+            # nonzero is row-major, so the last hit matches a row-by-row, cell-by-cell scan
+            hit_rows, hit_cols = np.nonzero(hits)
+            if len(hit_rows):
+                meta[label] = str(head.iat[hit_rows[-1], hit_cols[-1] + 1]).strip()
         
         return meta
     
-    def _group_by_division(self, df: pd.DataFrame) -> Dict[str, List[Dict[str, Any]]]:
-        """Group rows by construction division codes"""
-        divisions = {}
-        current_division = None
+    def _group_by_division(self, df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+        """Group line-item rows by construction division code, one DataFrame slice per division"""
+        ncols = df.shape[1]
         
-        for index, row in df.iterrows():
-            # Check if this row defines a new division
-            division_code = self._extract_division_code(row)
-            if division_code:
-                current_division = division_code
-                divisions[current_division] = []
-                continue
-            
-            # Check if this is a line item (has cost data)
-            if self._is_line_item(row) and current_division:
-                line_item = {
-                    'row_number': index + 1,
-                    'division': current_division,
-                    'A': str(row.iloc[0]) if len(row) > 0 else '',
-                    'C': str(row.iloc[2]) if len(row) > 2 else '',      # Description
-                    'D': str(row.iloc[3]) if len(row) > 3 else '',      # Quantity
-                    'E': str(row.iloc[4]) if len(row) > 4 else '',      # Unit
-                    'F': str(row.iloc[5]) if len(row) > 5 else '',      # Material
-                    'I': str(row.iloc[8]) if len(row) > 8 else '',      # Labor
-                    'K': str(row.iloc[10]) if len(row) > 10 else '',    # Sub/Equip
-                    'L': str(row.iloc[11]) if len(row) > 11 else '',    # Total
-                    'M': str(row.iloc[12]) if len(row) > 12 else '',    # Alt Total
-                    'N': str(row.iloc[13]) if len(row) > 13 else '',    # Scope Notes
-                    'O': str(row.iloc[14]) if len(row) > 14 else ''     # Estimating Notes
-                }
-                divisions[current_division].append(line_item)
+        # Classify all rows at once
+        division_codes = pd.Series(self._extract_division_codes(df), dtype=object)
+        is_header = division_codes.notna().to_numpy(dtype=bool)
+        is_line_item = self._line_item_mask(df)
+        
+        # Each header row opens a new block; a repeated code discards the earlier block's items
+        block = np.cumsum(is_header)
+        current_division = division_codes.ffill().to_numpy(dtype=object)
+        header_rows = np.flatnonzero(is_header)
+        last_block = {code: block[index] for index, code in zip(header_rows, division_codes.iloc[header_rows])}
+        is_last_block = np.zeros(len(header_rows) + 1, dtype=bool)
+        is_last_block[list(last_block.values())] = True
+        keep = is_line_item & ~is_header & is_last_block[block]
         
-        return divisions
+        rows = np.flatnonzero(keep)
+        line_df = pd.DataFrame({
+            'row_number': rows + 1,
+            'division': current_division[rows],
+            **{
+                letter: df.iloc[rows, col_idx].astype(str).to_numpy(dtype=object) if ncols > col_idx else ''
+                for letter, col_idx in _LINE_ITEM_COLUMNS.items()
+            },
+        })
+        
+        # Divisions keep first-header order, including headers with no line items
+        groups = dict(tuple(line_df.groupby('division', sort=False)))
+        empty = line_df.iloc[0:0]
+        return {code: groups.get(code, empty) for code in last_block}
     
-    def _extract_division_code(self, row) -> Optional[str]:
-        """Check if row contains a division header like '01', '02', etc."""
-        for cell in row:
-            cell_str = str(cell).strip()
-            # Look for pattern like "01", "02" or "01 - General Conditions"
-            if re.match(r'^\d{2}(\s*-|\s+)', cell_str):
-                return cell_str[:2]
-        return None
+    def divisions_to_records(self, divisions: Dict[str, pd.DataFrame]) -> Dict[str, List[Dict[str, Any]]]:
+        """Materialize division slices as lists of row dicts, e.g. for a JSON response"""
+        return {code: items.to_dict('records') for code, items in divisions.items()}
     
-    def _is_line_item(self, row) -> bool:
-        """Check if row contains actual cost line item data"""
-        # Check if any of the cost columns (F, I, K, L) have positive values
-        # AND has a description in column C
-        try:
-            # Must have a description
-            desc = str(row.iloc[2]).strip() if len(row) > 2 else ''
-            if not desc or desc == 'nan' or desc == '':
-                return False
-            
-            # Check for cost data in the correct columns
-            for col_idx in [5, 8, 10, 11]:  # F, I, K, L columns (Material, Labor, Sub/Equip, Total)
-                if len(row) > col_idx:
-                    val = str(row.iloc[col_idx]).replace('$', '').replace(',', '').strip()
-                    if val and val != '0' and val != '0.00' and val != 'nan':
-                        try:
-                            if float(val) > 0:
-                                return True
-                        except:
-                            pass
-            return False
-        except:
-            return False
+    def _extract_division_codes(self, df: pd.DataFrame) -> List[Optional[str]]:
+        """Division code per row where any cell is a header like '01 - General Conditions', else None"""
+        codes = pd.Series(None, index=df.index, dtype=object)
+        # Right-to-left so the leftmost matching cell wins
+        for col_idx in reversed(range(df.shape[1])):
+            cells = df.iloc[:, col_idx].astype(str).str.strip()
+            # Look for pattern like "01 - General Conditions" or "02 Site Work"
+            found = cells.str.extract(_DIV_RE, expand=False)
+            codes = found.where(found.notna(), codes)
+        return [code if isinstance(code, str) else None for code in codes]
+    
+    def _line_item_mask(self, df: pd.DataFrame) -> np.ndarray:
+        """Rows with a description in column C and a positive value in any cost column"""
+        ncols = df.shape[1]
+        if ncols <= 2:
+            return np.zeros(len(df), dtype=bool)
+        
+        # Must have a description
+        desc = df.iloc[:, 2].astype(str).str.strip()
+        has_desc = ((desc != '') & (desc != 'nan')).to_numpy(dtype=bool)
+        
+        # Check for cost data in the correct columns
+        has_cost = np.zeros(len(df), dtype=bool)
+        for col_idx in [5, 8, 10, 11]:  # F, I, K, L columns (Material, Labor, Sub/Equip, Total)
+            if ncols > col_idx:
+                vals = (
+                    df.iloc[:, col_idx].astype(str)
+                    .str.replace('$', '', regex=False)
+                    .str.replace(',', '', regex=False)
+                    .str.strip()
+                )
+                has_cost |= (pd.to_numeric(vals, errors='coerce') > 0).to_numpy(dtype=bool)
+        
+        return has_desc & has_cost
     
     def _extract_totals(self, df: pd.DataFrame) -> Dict[str, float]:
         """Extract project subtotal, overhead & profit, job total from summary rows"""
@@ -139,155 +271,265 @@ class DivisionByDivisionParser:
             "jobTotal": 0.0
         }
         
-        for index, row in df.iterrows():
-            for cell in row:
-                cell_str = str(cell).strip().lower()
-                
-                # Look for project subtotal
-                if 'project subtotal' in cell_str:
-                    # Find the total in the same row
-                    for val in row:
-                        if self._is_currency(str(val)):
-                            totals["projectSubtotal"] = self._parse_currency(str(val))
-                
-                # Look for overhead & profit
-                if 'overhead' in cell_str and 'profit' in cell_str:
-                    for val in row:
-                        if self._is_currency(str(val)):
-                            totals["overheadAndProfit"] = self._parse_currency(str(val))
-                
-                # Look for job total
-                if 'job total' in cell_str:
-                    for val in row:
-                        if self._is_currency(str(val)):
-                            totals["jobTotal"] = self._parse_currency(str(val))
+        if df.shape[1] == 0:
+            return totals
+        
+        # Lower-case every cell once, then find candidate rows with vectorized contains
+        lowered = df.astype(str).apply(lambda col: col.str.lower())
+        
+        def rows_with(*labels: str) -> np.ndarray:
+            # A single cell has to contain every label
+            hits = np.ones(lowered.shape, dtype=bool)
+            for label in labels:
+                hits &= lowered.apply(lambda col: col.str.contains(label, regex=False)).to_numpy(dtype=bool)
+            return np.flatnonzero(hits.any(axis=1))
+        
+        rows = df.to_numpy(dtype=object)
+        candidates = {
+            "projectSubtotal": rows_with('project subtotal'),
+            "overheadAndProfit": rows_with('overhead', 'profit'),
+            "jobTotal": rows_with('job total'),
+        }
+        
+        # Only the few matching rows are scanned for a currency value; later matches win
+        for key, row_indexes in candidates.items():
+            for index in row_indexes:
+                for val in rows[index]:
+                    if self._is_currency(str(val)):
+                        totals[key] = self._parse_currency(str(val))
         
         return totals
     
     def _is_currency(self, text: str) -> bool:
         """Check if text looks like a currency value"""
         text = text.strip()
-        return bool(re.match(r'^\$?[\d,]+\.?\d*$', text)) and len(text) > 3
+        # Cheap length and first-character checks reject most cells before the regex runs
+        if len(text) <= 3:
+            return False
+        first = text[0]
+        if first not in '$,' and not first.isdigit():
+            return False
+        return _CUR_RE.match(text) is not None
     
     def _parse_currency(self, text: str) -> float:
         """Convert currency text to float"""
-        clean = re.sub(r'[^\d.-]', '', text)
+        clean = _CUR_STRIP.sub('', text)
         try:
             return float(clean)
         except:
             return 0.0
     
-    def to_division_pack(self, division_code: str, division_items: List[Dict[str, Any]]) -> str:
+    def to_division_pack(self, division_code: str, division_items: pd.DataFrame) -> str:
         """Generate a compact CSV-like text block for a single division (20-80 rows max)"""
-        if not division_items:
+        if division_items.empty:
             return ""
         
-        # Create compact CSV-style representation
-        pack_lines = [
-            f"DIVISION: {division_code}",
-            "Row,A_Division,C_Description,D_Qty,E_Unit,F_Material,I_Labor,K_SubEquip,L_Total,N_Scope,O_Notes"
-        ]
+        return self._format_pack(division_code, division_items)
+    
+    def to_division_packs(self, divisions: Dict[str, pd.DataFrame]) -> Dict[str, str]:
+        """Pack text for every division with line items, in spreadsheet order"""
+        return {
+            division_code: self._format_pack(division_code, division_items)
+            for division_code, division_items in divisions.items()
+            if not division_items.empty
+        }
+    
+    def _format_pack(self, division_code: str, items: pd.DataFrame) -> str:
+        """Header lines plus one CSV row per item, written by pandas' CSV writer"""
+        rows = items.to_csv(columns=_PACK_COLUMNS, index=False, header=False, lineterminator='\n')
+        pack_text = f"DIVISION: {division_code}\n{_PACK_HEADER}\n{rows[:-1]}"
+        logger.debug("Division %s pack: %d rows, %d characters", division_code, len(items), len(pack_text))
+        
+        return pack_text
+    
+    def _cache_key(self, prompt: str) -> str:
+        return hashlib.blake2b(prompt.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _cache_get(self, key: str) -> Optional[str]:
+        content = self._response_cache.get(key)
+        if content is not None:
+            self._response_cache.move_to_end(key)
+        return content
+    
+    def _cache_set(self, key: str, content: str) -> None:
+        self._response_cache[key] = content
+        self._response_cache.move_to_end(key)
+        while len(self._response_cache) > NORMALIZE_CACHE_MAX_ENTRIES:
+            self._response_cache.popitem(last=False)
+    
+    async def _stream_completion(self, prompt: str, max_tokens: int) -> Tuple[str, Optional[str]]:
+        """Stream a JSON chat completion and return (content, finish_reason)"""
+        stream = await self.aclient.chat.completions.create(
+            model="gpt-4o-mini", 
+            messages=[
+                {"role": "system", "content": NORMALIZE_SYSTEM_PROMPT},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"},
+            temperature=0,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        
+        parts = []
+        finish_reason = None
+        async for chunk in stream:
+            if chunk.choices:
+                parts.append(chunk.choices[0].delta.content or '')
+                finish_reason = chunk.choices[0].finish_reason or finish_reason
+        return ''.join(parts), finish_reason
+    
+    def _max_tokens_for(self, *division_packs: str) -> int:
+        """Completion budget sized to the number of line items in the packs"""
+        # Each pack is a DIVISION line, a header line, then one line per item
+        item_count = sum(pack.count('\n') - 1 for pack in division_packs)
+        return min(NORMALIZE_MAX_TOKENS, NORMALIZE_BASE_TOKENS + NORMALIZE_TOKENS_PER_ITEM * item_count)
+    
+    async def _stream_with_retry(self, prompt: str, max_tokens: int) -> str:
+        """Stream a completion, retrying once with the full ceiling if the sized budget cut it short;
+        each attempt gets its own deadline"""
+        content, finish_reason = await asyncio.wait_for(
+            self._stream_completion(prompt, max_tokens), timeout=NORMALIZE_TIMEOUT_SECONDS
+        )
+        if finish_reason == 'length' and max_tokens < NORMALIZE_MAX_TOKENS:
+            content, _ = await asyncio.wait_for(
+                self._stream_completion(prompt, NORMALIZE_MAX_TOKENS), timeout=NORMALIZE_TIMEOUT_SECONDS
+            )
+        return content
+    
+    async def _complete_json(self, prompt: str, max_tokens: int) -> Dict[str, Any]:
+        """Run a normalization prompt and parse the JSON reply"""
+        # Re-uploaded estimates produce identical packs; skip the OpenAI round-trip
+        cache_key = self._cache_key(prompt)
+        content = self._cache_get(cache_key)
+        if content is None:
+            content = await self._stream_with_retry(prompt, max_tokens)
         
-        for item in division_items:
-            line = f"{item['row_number']},{item['A']},{item['C']},{item['D']},{item['E']},{item['F']},{item['I']},{item['K']},{item['L']},{item['N']},{item['O']}"
-            pack_lines.append(line)
+        result = orjson.loads(content) if orjson is not None else json.loads(content)
+        # Only cache responses that parsed
+        self._cache_set(cache_key, content)
+        return result
+    
+    def _with_division_total(self, result: Dict[str, Any], division_code: str) -> Dict[str, Any]:
+        """Calculate division total from code (source of truth for math)"""
+        items = result.get('items', [])
+        division_total = float(np.fromiter(
+            (item.get('totalCost', 0.0) for item in items), dtype=np.float64, count=len(items)
+        ).sum())
+        result['divisionTotal'] = round(division_total, 2)
         
-        pack_text = "\n".join(pack_lines)
-        print(f"Division {division_code} pack: {len(pack_lines)-2} rows, {len(pack_text)} characters")
+        logger.debug("Division %s normalized: %d items, calculated total: $%.2f", division_code, len(items), division_total)
         
-        return pack_text
+        return result
     
-    def normalize_with_chatgpt(self, division_pack: str, division_code: str) -> Optional[Dict[str, Any]]:
+    async def normalize_with_chatgpt(self, division_pack: str, division_code: str) -> Optional[Dict[str, Any]]:
         """Send compact division pack to ChatGPT for normalization"""
         try:
             if not division_pack.strip():
                 return None
             
-            prompt = f"""You are a construction estimator. Parse this division's data into normalized JSON.
-
-{division_pack}
+            prompt = f"""Parse division {division_code} into normalized JSON.
 
-The data format is: Row,A_Division,C_Description,D_Qty,E_Unit,F_Material,I_Labor,K_SubEquip,L_Total,N_Scope,O_Notes
-
-Rules:
-1. Extract only real cost line items (skip subtotals, headers, blank rows)
-2. For each valid item, create lineId as: divisionCode-slugified-description-rowNumber
-3. Parse quantities from D_Qty, units from E_Unit
-4. Parse costs: F_Material, I_Labor, K_SubEquip, L_Total
-5. Extract scope notes from N_Scope and estimating notes from O_Notes
-6. Use the values exactly as provided - DO NOT recalculate
-
-Return JSON format:
-{{
-  "divisionCode": "{division_code}",
-  "divisionName": "...",
-  "items": [
-    {{
-      "lineId": "01-permit-job-14",
-      "tradeDescription": "Permit - Job",
-      "quantity": 1.0,
-      "unit": "EA", 
-      "materialCost": 0.0,
-      "laborCost": 0.0,
-      "subEquipCost": 1020.0,
-      "totalCost": 1020.0,
-      "scopeNotes": "...",
-      "estimatingNotes": "..."
-    }}
-  ]
-}}
-
-Return ONLY the JSON - no explanations."""
+{division_pack}"""
             
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini", 
-                messages=[
-                    {"role": "system", "content": "You are a construction data normalizer. Return only valid JSON, no explanations."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0,
-                max_tokens=4000
-            )
-            
-            result = json.loads(response.choices[0].message.content)
+            result = await self._complete_json(prompt, self._max_tokens_for(division_pack))
+            return self._with_division_total(result, division_code)
             
-            # Calculate division total from code (source of truth for math)
-            division_total = sum(item.get('totalCost', 0) for item in result.get('items', []))
-            result['divisionTotal'] = round(division_total, 2)
+        except asyncio.TimeoutError:
+            logger.error("Timed out normalizing division %s (%ss per attempt)", division_code, NORMALIZE_TIMEOUT_SECONDS)
+            return None
+        except Exception as e:
+            logger.error("Error normalizing division %s: %s", division_code, e)
+            return None
+    
+    async def normalize_divisions_with_chatgpt(self, division_packs: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+        """Normalize several small division packs in one ChatGPT request, keyed by division code"""
+        codes = list(division_packs)
+        try:
+            packs_text = "\n\n".join(division_packs[code] for code in codes)
+            prompt = f"""Parse divisions {', '.join(codes)} into normalized JSON, keyed by division code.
+
+{packs_text}"""
             
-            print(f"Division {division_code} normalized: {len(result.get('items', []))} items, calculated total: ${division_total:.2f}")
+            response = await self._complete_json(prompt, self._max_tokens_for(*division_packs.values()))
+            by_code = response.get('divisions') or {}
             
-            return result
+            # Divisions missing from the reply are left for the caller to retry on their own
+            results = {}
+            for code in codes:
+                result = by_code.get(code)
+                if isinstance(result, dict):
+                    result.setdefault('divisionCode', code)
+                    results[code] = self._with_division_total(result, code)
+            return results
             
+        except asyncio.TimeoutError:
+            logger.error("Timed out normalizing divisions %s (%ss per attempt); retrying them one by one",
+                         ', '.join(codes), NORMALIZE_TIMEOUT_SECONDS)
+            return {}
         except Exception as e:
-            print(f"Error normalizing division {division_code}: {str(e)}")
-            return None
+            logger.error("Error normalizing divisions %s: %s", ', '.join(codes), e)
+            return {}
+    
+    def _bin_division_packs(self, division_packs: Dict[str, str]) -> List[List[str]]:
+        """Group division codes smallest-first so each group's packs fit in BATCH_PACK_MAX_CHARS"""
+        bins: List[List[str]] = []
+        bin_chars = 0
+        for code in sorted(division_packs, key=lambda c: len(division_packs[c])):
+            size = len(division_packs[code])
+            if bins and bin_chars + size <= BATCH_PACK_MAX_CHARS:
+                bins[-1].append(code)
+                bin_chars += size
+            else:
+                # Packs over the limit end up alone and take the single-division path
+                bins.append([code])
+                bin_chars = size
+        return bins
     
     async def parse_full_estimate(self, file_content: bytes, file_name: str, sheet_name: str) -> Dict[str, Any]:
         """Complete workflow: pandas parse → division-by-division AI → merge results"""
         try:
-            print(f"Starting division-by-division parsing of {file_name}")
+            logger.info("Starting division-by-division parsing of %s", file_name)
             
-            # Step 1: Parse with pandas and group by division
-            base_data = self.parse_excel_to_base_json(file_content, sheet_name)
+            # Step 1: Parse with pandas and group by division (off the event loop)
+            base_data = await asyncio.to_thread(self.parse_excel_to_base_json, file_content, sheet_name)
             
-            # Step 2: Process each division with AI using compact packs
-            processed_divisions = []
+            # Step 2: Create compact packs for every division with line items
+            division_packs = self.to_division_packs(base_data["divisions"])
             
-            for division_code, division_items in base_data["divisions"].items():
-                print(f"Processing division {division_code} with {len(division_items)} items")
-                
-                # Create compact division pack
-                division_pack = self.to_division_pack(division_code, division_items)
+            # Step 3: Normalize with AI concurrently, small divisions sharing a request
+            sem = asyncio.Semaphore(NORMALIZE_CONCURRENCY)
+            
+            async def normalize_division(division_code: str) -> Optional[Dict[str, Any]]:
+                async with sem:
+                    return await self.normalize_with_chatgpt(division_packs[division_code], division_code)
+            
+            async def normalize_bin(codes: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+                results = {}
+                if len(codes) > 1:
+                    async with sem:
+                        results = await self.normalize_divisions_with_chatgpt({code: division_packs[code] for code in codes})
                 
-                # Normalize with ChatGPT
-                division_result = self.normalize_with_chatgpt(division_pack, division_code)
-                if division_result:
-                    processed_divisions.append(division_result)
+                # Single packs, and any division the combined reply left out, get their own request
+                missing = [code for code in codes if code not in results]
+                for code, result in zip(missing, await asyncio.gather(*(normalize_division(code) for code in missing))):
+                    results[code] = result
+                return results
+            
+            results = {}
+            for bin_results in await asyncio.gather(*(
+                normalize_bin(codes) for codes in self._bin_division_packs(division_packs)
+            )):
+                results.update(bin_results)
+            
+            # Keep the spreadsheet's division order
+            processed_divisions = [results[code] for code in division_packs if results.get(code)]
             
-            # Step 3: Combine results
-            grand_total_from_items = sum(div.get('divisionTotal', 0) for div in processed_divisions)
+            # Step 4: Combine results
+            grand_total_from_items = float(np.fromiter(
+                (div.get('divisionTotal', 0.0) for div in processed_divisions),
+                dtype=np.float64, count=len(processed_divisions)
+            ).sum())
             
             final_result = {
                 "meta": base_data["meta"],
@@ -298,9 +540,9 @@ Return ONLY the JSON - no explanations."""
                 "grandTotalFromItems": grand_total_from_items
             }
             
-            print(f"Parsing complete: {len(processed_divisions)} divisions, ${grand_total_from_items:,.2f} total")
+            logger.info("Parsing complete: %d divisions, $%.2f total", len(processed_divisions), grand_total_from_items)
             
             return final_result
             
         except Exception as e:
-            raise Exception(f"Division-by-division parsing failed: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Division-by-division parsing failed: {str(e)}")
@@ -1,12 +1,116 @@
+import asyncio
+import hashlib
+import httpx
 import pandas as pd
+import numpy as np
 import io
+import math
 import re
 import json
 import string
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
 from typing import Dict, List, Any, Optional, Tuple
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 import os
 
+from .excel_parser import NA_STRINGS
+
+try:
+    from python_calamine import CalamineWorkbook  # Rust-backed reader; rows come back as plain Python lists
+except ImportError:  # Fall back to pandas' openpyxl reader
+    CalamineWorkbook = None
+
+# Max division normalizations in flight at once
+NORMALIZE_CONCURRENCY = 10
+
+# Max normalized division responses kept in the in-process cache
+NORMALIZE_CACHE_MAX_ENTRIES = 512
+
+# Completion budget per division: a base plus a per-line-item allowance, capped
+NORMALIZE_BASE_TOKENS = 200
+NORMALIZE_TOKENS_PER_ITEM = 80
+NORMALIZE_MAX_TOKENS = 4000
+
+# Identical on every call so OpenAI can serve it from the prompt-prefix cache;
+# only the division pack goes in the user message
+NORMALIZE_SYSTEM_PROMPT = """You are a construction data normalizer. Clean up the division's text while keeping all numbers exactly the same.
+
+The user message is one division pack: DIVISION_CODE, DIVISION_NAME, then one "- [row=N]" line per item.
+
+Rules:
+1. Keep ALL numeric values exactly as provided (quantities, costs)
+2. Clean up tradeDescription text (fix typos, standardize format)
+3. Normalize units to: EA, LF, SF, SY, CY, HR, LS (or null if unclear)
+4. Clean up scope notes and estimating notes
+5. lineId is the divisionCode, a slug of the description and the row number, joined by "-"
+
+Return ONLY valid JSON, no explanations:
+{"divisionCode": "XX", "divisionName": "cleaned name", "items": [{"lineId": "...", "tradeDescription": "...", "quantity": 0.0, "unit": "EA or null", "materialCost": 0.0, "laborCost": 0.0, "subEquipCost": 0.0, "totalCost": 0.0, "scopeNotes": "... or null", "estimatingNotes": "... or null"}]}"""
+
+# Batch API polling for offline normalization (batches complete within a 24h window)
+BATCH_POLL_SECONDS = 30
+BATCH_TERMINAL_STATUSES = ('completed', 'failed', 'expired', 'cancelled')
+
+# Shared connection pool so every parser reuses TCP/TLS sessions
+HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=32)
+# The SDK adopts a custom client's timeout; keep its 600s default for reads, since
+# non-streamed 4000-token normalizations can run past a minute
+HTTP_TIMEOUT = httpx.Timeout(600.0, connect=5.0)
+# The SDK's own retry layer: rate limits (429), 5xx and connection errors, with
+# exponential backoff and jitter that honours retry-after
+OPENAI_MAX_RETRIES = 5
+
+# OpenAI clients are created on first use and shared by all EstimateParser instances
+_client: Optional[OpenAI] = None
+_async_client: Optional[AsyncOpenAI] = None
+
+
+def _get_client() -> OpenAI:
+    global _client
+    if _client is None:
+        _client = OpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=httpx.Client(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT),
+            max_retries=OPENAI_MAX_RETRIES
+        )
+    return _client
+
+
+def _get_async_client() -> AsyncOpenAI:
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT),
+            max_retries=OPENAI_MAX_RETRIES
+        )
+    return _async_client
+
+
+def _excel_cell(value):
+    """One calamine cell as pd.read_excel(dtype=object) would return it"""
+    if isinstance(value, float):
+        as_int = int(value)
+        return as_int if as_int == value else value
+    if isinstance(value, str):
+        return np.nan if value in NA_STRINGS else value
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day)
+    return value
+
+
+def _ascii_slug_table(strip_re: re.Pattern, dash_re: re.Pattern) -> Dict[int, Optional[str]]:
+    """Translate table for ASCII slugs: drop what strip_re drops, dash_re characters become '-'"""
+    return str.maketrans({
+        c: None if strip_re.match(c) else '-'
+        for c in map(chr, range(128))
+        if strip_re.match(c) or dash_re.match(c)
+    })
+
 
 class EstimateParser:
     """
@@ -17,62 +121,76 @@ class EstimateParser:
     - Outputs exact JSON contract with 2-decimal floats
     """
     
+    # Header mapping patterns (case-insensitive, fuzzy match)
+    header_mappings = {
+        'division': ['division', 'div', 'section'],
+        'tradeDescription': ['trade description', 'description', 'item', 'desc'],
+        'quantity': ['qty', 'quantity'],
+        'unit': ['unit', 'units', 'um', 'uom'],
+        'materialCost': ['material subtotal', 'materials', 'material'],
+        'laborCost': ['labor subtotal', 'labor'],
+        'subEquipCost': ['sub/equip subtotal', 'subcontractor', 'equipment', 's/equip', 'sub equip'],
+        'totalCost': ['budget total', 'total', 'line total'],
+        'scopeNotes': ['scope notes', 'scope'],
+        'estimatingNotes': ['estimating notes', 'notes']
+    }
+    
+    # Reverse lookup so each header cell is swept against every pattern once
+    _header_lookup = {pattern: field for field, patterns in header_mappings.items() for pattern in patterns}
+    
+    # Skip patterns for summary rows (case-insensitive)
+    skip_patterns = [
+        r'subtotal',
+        r'project subtotal', 
+        r'overhead',
+        r'profit',
+        r'job total',
+        r'payment terms',
+        r'accepted by',
+        r'terms',
+        r'warranty',
+        r'contingency',
+        r'fee'
+    ]
+    
+    # Valid unit normalizations
+    valid_units = ['EA', 'LF', 'SF', 'SY', 'CY', 'HR', 'LS']
+    _valid_units_set = frozenset(valid_units)
+    
+    # Compiled once for all parsers; the skip check becomes a single alternation search
+    _skip_re = re.compile('|'.join(skip_patterns), re.IGNORECASE)
+    _div_digit_re = re.compile(r'^\d{1,2}$')
+    _div_desc_re = re.compile(r'^\s*(\d{2})\s*[-–]\s*(.+)')
+    _csi_re = re.compile(r'\b(\d{3,4})\b')
+    _currency_re = re.compile(r'^\$?[\d,]+\.?\d*$')
+    _nonnum_re = re.compile(r'[^\d.-]')
+    _totals_re = re.compile(r'project subtotal|overhead|job total', re.IGNORECASE)  # prefilter for _scan_sheet
+    _float_re = re.compile(r'-?(?:\d+\.?\d*|\.\d+)')  # what float() accepts after _nonnum_re
+    _slug_strip = re.compile(r'[^\w\s-]')
+    _slug_dash = re.compile(r'[-\s]+')
+    _slug_dashes = re.compile(r'-+')
+    _slug_table = _ascii_slug_table(_slug_strip, _slug_dash)
+    
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        
-        # Header mapping patterns (case-insensitive, fuzzy match)
-        self.header_mappings = {
-            'division': ['division', 'div', 'section'],
-            'tradeDescription': ['trade description', 'description', 'item', 'desc'],
-            'quantity': ['qty', 'quantity'],
-            'unit': ['unit', 'units', 'um', 'uom'],
-            'materialCost': ['material subtotal', 'materials', 'material'],
-            'laborCost': ['labor subtotal', 'labor'],
-            'subEquipCost': ['sub/equip subtotal', 'subcontractor', 'equipment', 's/equip', 'sub equip'],
-            'totalCost': ['budget total', 'total', 'line total'],
-            'scopeNotes': ['scope notes', 'scope'],
-            'estimatingNotes': ['estimating notes', 'notes']
-        }
-        
-        # Skip patterns for summary rows (case-insensitive)
-        self.skip_patterns = [
-            r'subtotal',
-            r'project subtotal', 
-            r'overhead',
-            r'profit',
-            r'job total',
-            r'payment terms',
-            r'accepted by',
-            r'terms',
-            r'warranty',
-            r'contingency',
-            r'fee'
-        ]
-        
-        # Valid unit normalizations
-        self.valid_units = ['EA', 'LF', 'SF', 'SY', 'CY', 'HR', 'LS']
+        # LRU cache of raw model responses keyed by division pack hash
+        self._response_cache: "OrderedDict[str, str]" = OrderedDict()
+        self._cache_lock = threading.Lock()  # normalize_all_sync touches the cache from worker threads
     
     def parse_estimate_xlsx(self, file_content: bytes, sheet_name: str) -> Dict[str, Any]:
         """
         Main entry point: Parse Excel estimate into exact JSON contract
         """
         try:
-            # Read Excel sheet
-            df = pd.read_excel(io.BytesIO(file_content), sheet_name=sheet_name)
-            print(f"Loaded sheet '{sheet_name}' with {len(df)} rows, {len(df.columns)} columns")
-            
-            # Step 1: Resolve column headers
-            column_map = self._resolve_headers(df)
-            print(f"Resolved columns: {column_map}")
+            # Read Excel sheet: header labels plus an object array of the rows below them
+            columns, values = self._read_sheet(file_content, sheet_name)
+            print(f"Loaded sheet '{sheet_name}' with {len(values)} rows, {len(columns)} columns")
             
-            # Step 2: Extract meta information
-            meta = self._extract_meta(df)
+            # Steps 1, 2 and 4: resolve column headers, meta information and Excel totals in one scan
+            column_map, meta, excel_totals = self._scan_sheet(columns, values)
+            print(f"Resolved columns: { {field: columns[col_idx] for field, col_idx in column_map.items()} }")
             
             # Step 3: Parse line items with division detection
-            divisions = self._parse_divisions_and_items(df, column_map)
-            
-            # Step 4: Extract Excel totals
-            excel_totals = self._extract_excel_totals(df)
+            divisions = self._parse_divisions_and_items(values, column_map)
             
             # Step 5: Calculate totals from parsed items
             grand_total_from_items = sum(
@@ -99,38 +217,110 @@ class EstimateParser:
         except Exception as e:
             raise Exception(f"Parse failed: {str(e)}")
     
-    def _resolve_headers(self, df: pd.DataFrame) -> Dict[str, Optional[str]]:
+    def _read_sheet(self, file_content: bytes, sheet_name: str) -> Tuple[List[Any], np.ndarray]:
         """
-        Scan header rows 2-6 and map columns by meaning, not position
+        Header labels and a 2D object array of the data rows below the header row.
+        Cells match pd.read_excel(dtype=object): integral floats as int, dates as
+        datetime, missing or NA text as NaN
+        """
+        if CalamineWorkbook is None:
+            df = pd.read_excel(io.BytesIO(file_content), sheet_name=sheet_name, engine='openpyxl', dtype=object)
+            return list(df.columns), df.to_numpy(dtype=object)
+        
+        # Walk calamine's row lists directly; no DataFrame is needed
+        workbook = CalamineWorkbook.from_filelike(io.BytesIO(file_content))
+        rows = workbook.get_sheet_by_name(sheet_name).to_python(skip_empty_area=False)
+        if not rows:
+            return [], np.empty((0, 0), dtype=object)
+        
+        header = [_excel_cell(value) for value in rows[0]]
+        columns = [f"Unnamed: {i}" if pd.isna(value) else value for i, value in enumerate(header)]
+        
+        values = np.empty((len(rows) - 1, len(columns)), dtype=object)
+        for row_idx, row in enumerate(rows[1:]):
+            values[row_idx] = [_excel_cell(value) for value in row]
+        
+        return columns, values
+    
+    def _scan_sheet(self, columns: List[Any], values: np.ndarray) -> Tuple[Dict[str, int], Dict[str, Optional[str]], Dict[str, float]]:
+        """
+        Single pass over the sheet that feeds lowercased cells to the header
+        resolver (rows 1-6), meta extraction (rows 1-10) and the Excel totals
+        search (every row). Mapped fields point at column positions
         """
         column_map = {}
+        meta = {"client": None, "project": None, "date": None}
+        totals = {
+            "projectSubtotal": 0.0,
+            "overheadAndProfit": 0.0,
+            "jobTotal": 0.0
+        }
         
-        # Look in rows 1-5 for headers (0-indexed)
-        for row_idx in range(min(6, len(df))):
-            row = df.iloc[row_idx]
+        # Lowercase the header/meta rows as one char array
+        head = values[:10]
+        head_missing = pd.isna(head)
+        head_lowered = np.char.lower(np.char.strip(head.astype(str))).tolist()
+        
+        # Below the head only totals rows matter; find candidates column by column
+        total_rows = np.zeros(len(values), dtype=bool)
+        for col_idx in range(values.shape[1]):
+            column = pd.Series(values[:, col_idx], dtype=object)
+            total_rows |= column.astype(str).str.contains(self._totals_re).to_numpy(dtype=bool)
+        total_rows[:len(head)] = True
+        
+        for row_idx in np.flatnonzero(total_rows).tolist():
+            row = values[row_idx]
+            if row_idx < len(head):
+                lowered = [None if missing else cell_str for missing, cell_str in zip(head_missing[row_idx], head_lowered[row_idx])]
+            else:
+                lowered = [None if pd.isna(cell_value) else str(cell_value).strip().lower() for cell_value in row]
             
-            for field, patterns in self.header_mappings.items():
-                if field in column_map:
-                    continue  # Already found
+            # Header rows: map columns by meaning, not position
+            if row_idx < 6 and len(column_map) < len(self.header_mappings):
+                # Unmapped fields each cell's normalized header matches
+                cell_fields = []
+                for cell_str in lowered:
+                    header = None if cell_str is None else self._normalize_header(cell_str)
+                    cell_fields.append(set() if header is None else {
+                        field for pattern, field in self._header_lookup.items()
+                        if field not in column_map and pattern in header
+                    })
                 
-                for col_idx, cell_value in enumerate(row):
-                    if pd.isna(cell_value):
-                        continue
-                    
-                    # Normalize cell value
-                    normalized = self._normalize_header(str(cell_value))
+                for field in self.header_mappings:
+                    if field in column_map:
+                        continue  # Already found
                     
-                    # Check if it matches any pattern for this field
-                    for pattern in patterns:
-                        if pattern in normalized:
-                            column_map[field] = df.columns[col_idx]
-                            print(f"Mapped {field} -> {df.columns[col_idx]} (found '{cell_value}')")
+                    for col_idx, fields in enumerate(cell_fields):
+                        if field in fields:
+                            column_map[field] = col_idx
+                            print(f"Mapped {field} -> {columns[col_idx]} (found '{row[col_idx]}')")
                             break
-                    
-                    if field in column_map:
-                        break
+            
+            row_total = None  # _find_currency_in_row result, looked up at most once per row
+            for col_idx, cell_str in enumerate(lowered):
+                if cell_str is None:
+                    continue
+                
+                # Meta keywords in the first 10 rows; the value is in the adjacent cell
+                if row_idx < 10 and col_idx + 1 < len(row) and lowered[col_idx + 1] is not None:
+                    for key in ('client', 'project', 'date'):
+                        if key in cell_str:
+                            meta[key] = str(row[col_idx + 1]).strip()
+                
+                # Excel totals: Project Subtotal, Overhead & Profit, Job Total
+                for total_key, matched in (
+                    ("projectSubtotal", 'project subtotal' in cell_str),
+                    ("overheadAndProfit", 'overhead' in cell_str and 'profit' in cell_str),
+                    ("jobTotal", 'job total' in cell_str),
+                ):
+                    if not matched:
+                        continue
+                    if row_total is None:
+                        row_total = self._find_currency_in_row(row) or 0.0
+                    if row_total:
+                        totals[total_key] = row_total
         
-        return column_map
+        return column_map, meta, totals
     
     def _normalize_header(self, header: str) -> str:
         """
@@ -142,41 +332,7 @@ class EstimateParser:
         normalized = ' '.join(normalized.split())  # Collapse whitespace
         return normalized
     
-    def _extract_meta(self, df: pd.DataFrame) -> Dict[str, Optional[str]]:
-        """
-        Extract client, project, date from header rows
-        """
-        meta = {"client": None, "project": None, "date": None}
-        
-        # Look in first 10 rows
-        for row_idx in range(min(10, len(df))):
-            row = df.iloc[row_idx]
-            
-            for col_idx, cell_value in enumerate(row):
-                if pd.isna(cell_value):
-                    continue
-                
-                cell_str = str(cell_value).strip().lower()
-                
-                # Look for meta keywords and extract adjacent value
-                if 'client' in cell_str and col_idx + 1 < len(row):
-                    next_val = row.iloc[col_idx + 1]
-                    if not pd.isna(next_val):
-                        meta["client"] = str(next_val).strip()
-                
-                if 'project' in cell_str and col_idx + 1 < len(row):
-                    next_val = row.iloc[col_idx + 1]
-                    if not pd.isna(next_val):
-                        meta["project"] = str(next_val).strip()
-                
-                if 'date' in cell_str and col_idx + 1 < len(row):
-                    next_val = row.iloc[col_idx + 1]
-                    if not pd.isna(next_val):
-                        meta["date"] = str(next_val).strip()
-        
-        return meta
-    
-    def _parse_divisions_and_items(self, df: pd.DataFrame, column_map: Dict[str, str]) -> List[Dict[str, Any]]:
+    def _parse_divisions_and_items(self, values: np.ndarray, column_map: Dict[str, int]) -> List[Dict[str, Any]]:
         """
         Parse divisions and line items with robust division detection
         """
@@ -184,106 +340,103 @@ class EstimateParser:
         current_division_code = None
         current_division_name = None
         current_items = []
-        
-        for row_idx, row in df.iterrows():
+        current_total = 0.0  # running sum of current_items' totalCost
+        
+        # Descriptions, skip flags and cleaned costs for every row in column-wise passes
+        descriptions = self._text_column(values, column_map.get('tradeDescription'))
+        skip_rows = pd.Series(descriptions, dtype=object).str.contains(self._skip_re).to_numpy(dtype=bool)
+        costs = np.column_stack([
+            self._cost_column(values, column_map.get(field))
+            for field in ('materialCost', 'laborCost', 'subEquipCost', 'totalCost')
+        ]).tolist()
+        
+        # Column views for division codes and the remaining fields, fetched once per sheet
+        first_col = self._field_column(values, 0 if values.shape[1] else None)
+        qty_col, unit_col, scope_col, est_col = (
+            self._field_column(values, column_map.get(field))
+            for field in ('quantity', 'unit', 'scopeNotes', 'estimatingNotes')
+        )
+        
+        for row_idx in range(len(values)):
             # Check for division header
-            division_info = self._detect_division(row, column_map)
+            division_info = self._detect_division(first_col[row_idx], descriptions[row_idx])
             if division_info:
                 # Save previous division if it has items
                 if current_division_code and current_items:
-                    division_total = sum(item['totalCost'] for item in current_items)
                     divisions.append({
                         "divisionCode": current_division_code,
                         "divisionName": current_division_name or f"Division {current_division_code}",
                         "items": current_items,
-                        "divisionTotal": round(division_total, 2)
+                        "divisionTotal": round(current_total, 2)
                     })
                 
                 # Start new division
                 current_division_code = division_info['code']
                 current_division_name = division_info['name']
                 current_items = []
+                current_total = 0.0
                 continue
             
             # Check for line item
             if current_division_code:
-                line_item = self._parse_line_item(row, row_idx, column_map, current_division_code)
+                line_item = self._parse_line_item(
+                    row_idx, current_division_code, descriptions[row_idx], skip_rows[row_idx], costs[row_idx],
+                    qty_col[row_idx], unit_col[row_idx], scope_col[row_idx], est_col[row_idx]
+                )
                 if line_item:
                     current_items.append(line_item)
+                    current_total += line_item['totalCost']
         
         # Don't forget the last division
         if current_division_code and current_items:
-            division_total = sum(item['totalCost'] for item in current_items)
             divisions.append({
                 "divisionCode": current_division_code,
                 "divisionName": current_division_name or f"Division {current_division_code}",
                 "items": current_items,
-                "divisionTotal": round(division_total, 2)
+                "divisionTotal": round(current_total, 2)
             })
         
         return divisions
     
-    def _detect_division(self, row, column_map: Dict[str, str]) -> Optional[Dict[str, str]]:
+    def _detect_division(self, first_value, description: str) -> Optional[Dict[str, str]]:
         """
         Detect division header row based on patterns:
         - First column is 1-2 digits (^\d{1,2}$) or
         - Description starts with ^\s*(\d{2})\s*[-–]\s*(.+)
         """
         # Check first column for simple digit pattern
-        if len(row) > 0 and not pd.isna(row.iloc[0]):
-            first_cell = str(row.iloc[0]).strip()
-            if re.match(r'^\d{1,2}$', first_cell):
-                # Look for name in description column or next cell
-                name = ""
-                if 'tradeDescription' in column_map:
-                    desc_col = column_map['tradeDescription']
-                    if desc_col in df.columns:
-                        desc_val = row[desc_col]
-                        if not pd.isna(desc_val):
-                            name = str(desc_val).strip()
-                
+        if not pd.isna(first_value):
+            first_cell = str(first_value).strip()
+            if self._div_digit_re.match(first_cell):
                 return {
                     'code': first_cell.zfill(2),  # Pad to 2 digits
-                    'name': name
+                    'name': description
                 }
         
         # Check description column for pattern like "02 - Site Work"
-        if 'tradeDescription' in column_map:
-            desc_col = column_map['tradeDescription']
-            if desc_col in df.columns and not pd.isna(row[desc_col]):
-                desc_value = str(row[desc_col]).strip()
-                match = re.match(r'^\s*(\d{2})\s*[-–]\s*(.+)', desc_value)
-                if match:
-                    return {
-                        'code': match.group(1),
-                        'name': match.group(2).strip()
-                    }
+        if description:
+            match = self._div_desc_re.match(description)
+            if match:
+                return {
+                    'code': match.group(1),
+                    'name': match.group(2).strip()
+                }
         
         return None
     
-    def _parse_line_item(self, row, row_idx: int, column_map: Dict[str, str], division_code: str) -> Optional[Dict[str, Any]]:
+    def _parse_line_item(self, row_idx: int, division_code: str, description: str, skip: bool,
+                         costs: List[float], qty_value, unit_value, scope_value, est_value) -> Optional[Dict[str, Any]]:
         """
         Parse a single line item if it's valid
         """
-        # Get description
-        description = ""
-        if 'tradeDescription' in column_map and column_map['tradeDescription']:
-            desc_val = row[column_map['tradeDescription']]
-            if not pd.isna(desc_val):
-                description = str(desc_val).strip()
-        
         if not description:
             return None
         
         # Skip summary rows
-        if self._should_skip_row(description):
+        if skip:
             return None
         
-        # Extract costs
-        material_cost = self._extract_cost(row, column_map.get('materialCost'))
-        labor_cost = self._extract_cost(row, column_map.get('laborCost'))
-        subequip_cost = self._extract_cost(row, column_map.get('subEquipCost'))
-        total_cost = self._extract_cost(row, column_map.get('totalCost'))
+        material_cost, labor_cost, subequip_cost, total_cost = costs
         
         # Skip if all costs are zero
         if material_cost == 0 and labor_cost == 0 and subequip_cost == 0 and total_cost == 0:
@@ -294,10 +447,10 @@ class EstimateParser:
             total_cost = material_cost + labor_cost + subequip_cost
         
         # Extract other fields
-        quantity = self._extract_quantity(row, column_map.get('quantity'))
-        unit = self._extract_unit(row, column_map.get('unit'))
-        scope_notes = self._extract_notes(row, column_map.get('scopeNotes'))
-        estimating_notes = self._extract_notes(row, column_map.get('estimatingNotes'))
+        quantity = self._extract_quantity(qty_value)
+        unit = self._extract_unit(unit_value)
+        scope_notes = self._extract_notes(scope_value)
+        estimating_notes = self._extract_notes(est_value)
         
         # Generate stable lineId
         line_id = self._generate_line_id(division_code, description, row_idx)
@@ -315,42 +468,64 @@ class EstimateParser:
             "estimatingNotes": estimating_notes
         }
     
-    def _should_skip_row(self, description: str) -> bool:
+    def _text_column(self, values: np.ndarray, col_idx: Optional[int]) -> List[str]:
         """
-        Check if row should be skipped based on skip patterns
+        Stripped cell text for one column, '' for missing cells or an unmapped column
         """
-        desc_lower = description.lower()
-        for pattern in self.skip_patterns:
-            if re.search(pattern, desc_lower):
-                return True
-        return False
+        if col_idx is None:
+            return [''] * len(values)
+        
+        column = pd.Series(values[:, col_idx], dtype=object)
+        return column.astype(str).str.strip().where(column.notna(), '').tolist()
     
-    def _extract_cost(self, row, column_name: Optional[str]) -> float:
+    def _cost_column(self, values: np.ndarray, col_idx: Optional[int]) -> np.ndarray:
         """
-        Extract and clean cost value
+        Cleaned currency values for one column; missing or unparseable cells are 0.0
         """
-        if not column_name or column_name not in row.index:
-            return 0.0
+        if col_idx is None:
+            return np.zeros(len(values))
         
-        value = row[column_name]
-        if pd.isna(value):
-            return 0.0
+        cells = values[:, col_idx]
+        costs = np.zeros(len(cells))
         
-        # Clean currency format
-        clean_value = re.sub(r'[^\d.-]', '', str(value))
-        try:
-            return float(clean_value) if clean_value else 0.0
-        except:
-            return 0.0
+        # Plain numeric cells convert directly; only text cells need the currency clean
+        direct = np.fromiter((self._is_plain_number(v) for v in cells), dtype=bool, count=len(cells))
+        costs[direct] = cells[direct].astype(float)
+        
+        text = ~direct
+        if text.any():
+            column = pd.Series(cells[text], dtype=object)
+            # Clean currency format
+            cleaned = column.astype(str).str.replace(self._nonnum_re, '', regex=True)
+            valid = (cleaned.str.fullmatch(self._float_re) & column.notna()).to_numpy(dtype=bool)
+            # float() on object strings keeps Python's exact string-to-float conversion
+            costs[text] = np.where(valid, cleaned.to_numpy(dtype=object), '0').astype(object).astype(float)
+        
+        return costs
     
-    def _extract_quantity(self, row, column_name: Optional[str]) -> float:
+    @staticmethod
+    def _is_plain_number(value) -> bool:
+        """
+        True for int/float cells whose str() has no exponent, so cleaning it would be a no-op
+        """
+        if type(value) is int:
+            return -10**16 < value < 10**16
+        if type(value) is float:
+            return value == 0 or 1e-4 <= abs(value) < 1e16
+        return False
+    
+    def _field_column(self, values: np.ndarray, col_idx: Optional[int]) -> np.ndarray:
+        """
+        One column of the sheet; an unmapped field reads as all-missing cells
+        """
+        if col_idx is None:
+            return np.full(len(values), None, dtype=object)
+        return values[:, col_idx]
+    
+    def _extract_quantity(self, value) -> float:
         """
         Extract quantity value
         """
-        if not column_name or column_name not in row.index:
-            return 1.0
-        
-        value = row[column_name]
         if pd.isna(value):
             return 1.0
         
@@ -359,19 +534,19 @@ class EstimateParser:
         except:
             return 1.0
     
-    def _extract_unit(self, row, column_name: Optional[str]) -> Optional[str]:
+    def _extract_unit(self, value) -> Optional[str]:
         """
         Extract and normalize unit
         """
-        if not column_name or column_name not in row.index:
-            return None
-        
-        value = row[column_name]
         if pd.isna(value):
             return None
         
         unit_str = str(value).strip().upper()
         
+        # Usually the cell is exactly a valid unit
+        if unit_str in self._valid_units_set:
+            return unit_str
+        
         # Normalize to valid units
         for valid_unit in self.valid_units:
             if valid_unit in unit_str:
@@ -379,14 +554,10 @@ class EstimateParser:
         
         return None
     
-    def _extract_notes(self, row, column_name: Optional[str]) -> Optional[str]:
+    def _extract_notes(self, value) -> Optional[str]:
         """
         Extract notes field
         """
-        if not column_name or column_name not in row.index:
-            return None
-        
-        value = row[column_name]
         if pd.isna(value):
             return None
         
@@ -398,53 +569,19 @@ class EstimateParser:
         Generate stable lineId: {divisionCode}-{optionalCSI-}{slug(desc)[:24]}-{rowIndex}
         """
         # Extract optional CSI code from description
-        csi_match = re.search(r'\b(\d{3,4})\b', description)
+        csi_match = self._csi_re.search(description)
         csi_part = f"{csi_match.group(1)}-" if csi_match else ""
         
-        # Create slug from description
-        slug = re.sub(r'[^\w\s-]', '', description.lower())
-        slug = re.sub(r'[-\s]+', '-', slug)
+        # Create slug from description; ASCII text takes the one-pass translate table
+        slug = description.lower()
+        if slug.isascii():
+            slug = self._slug_dashes.sub('-', slug.translate(self._slug_table))
+        else:
+            slug = self._slug_dash.sub('-', self._slug_strip.sub('', slug))
         slug = slug[:24].rstrip('-')
         
         return f"{division_code}-{csi_part}{slug}-{row_idx}"
     
-    def _extract_excel_totals(self, df: pd.DataFrame) -> Dict[str, float]:
-        """
-        Extract Excel totals (Project Subtotal, Overhead & Profit, Job Total)
-        """
-        totals = {
-            "projectSubtotal": 0.0,
-            "overheadAndProfit": 0.0,
-            "jobTotal": 0.0
-        }
-        
-        for row_idx, row in df.iterrows():
-            for cell_value in row:
-                if pd.isna(cell_value):
-                    continue
-                
-                cell_str = str(cell_value).strip().lower()
-                
-                # Look for project subtotal
-                if 'project subtotal' in cell_str:
-                    total_val = self._find_currency_in_row(row)
-                    if total_val:
-                        totals["projectSubtotal"] = total_val
-                
-                # Look for overhead & profit
-                if 'overhead' in cell_str and 'profit' in cell_str:
-                    total_val = self._find_currency_in_row(row)
-                    if total_val:
-                        totals["overheadAndProfit"] = total_val
-                
-                # Look for job total
-                if 'job total' in cell_str:
-                    total_val = self._find_currency_in_row(row)
-                    if total_val:
-                        totals["jobTotal"] = total_val
-        
-        return totals
-    
     def _find_currency_in_row(self, row) -> Optional[float]:
         """
         Find currency value in a row
@@ -454,8 +591,8 @@ class EstimateParser:
                 continue
             
             cell_str = str(cell_value).strip()
-            if re.match(r'^\$?[\d,]+\.?\d*$', cell_str) and len(cell_str) > 3:
-                clean_value = re.sub(r'[^\d.-]', '', cell_str)
+            if self._currency_re.match(cell_str) and len(cell_str) > 3:
+                clean_value = self._nonnum_re.sub('', cell_str)
                 try:
                     return round(float(clean_value), 2)
                 except:
@@ -467,17 +604,28 @@ class EstimateParser:
         Validate output matches JSON contract
         """
         # Check grandTotalFromItems equals sum of division totals
-        expected_grand_total = sum(div['divisionTotal'] for div in result['divisions'])
+        expected_grand_total = math.fsum(div['divisionTotal'] for div in result['divisions'])
         if abs(result['grandTotalFromItems'] - expected_grand_total) > 0.01:
             raise Exception(f"grandTotalFromItems mismatch: {result['grandTotalFromItems']} != {expected_grand_total}")
         
-        # Validate all floats are 2 decimals
-        for division in result['divisions']:
-            for item in division['items']:
-                for field in ['quantity', 'materialCost', 'laborCost', 'subEquipCost', 'totalCost']:
-                    value = item[field]
-                    if not isinstance(value, (int, float)) or round(value, 2) != value:
-                        raise Exception(f"Invalid decimal format for {field}: {value}")
+        # Validate all floats are 2 decimals; _parse_line_item already rounds, so python -O skips this
+        if __debug__:
+            fields = ['quantity', 'materialCost', 'laborCost', 'subEquipCost', 'totalCost']
+            items = [item for division in result['divisions'] for item in division['items']]
+            # np.array would coerce numeric strings such as "12.50", so check types first
+            for item in items:
+                for field in fields:
+                    if not isinstance(item[field], (int, float)):
+                        raise Exception(f"Invalid decimal format for {field}: {item[field]}")
+            try:
+                arr = np.array([[item[field] for field in fields] for item in items], dtype=np.float64)
+            except (TypeError, ValueError) as e:
+                raise Exception(f"Invalid decimal format: {str(e)}")
+            
+            invalid = ~np.isclose(np.round(arr, 2), arr, atol=1e-9).reshape(-1, len(fields))
+            if invalid.any():
+                row, col = np.argwhere(invalid)[0]
+                raise Exception(f"Invalid decimal format for {fields[col]}: {items[row][fields[col]]}")
     
     def to_division_pack(self, division_obj: Dict[str, Any]) -> str:
         """
@@ -486,28 +634,81 @@ class EstimateParser:
         if not division_obj.get('items'):
             return ""
         
-        lines = [
-            f"DIVISION_CODE: {division_obj['divisionCode']}",
-            f"DIVISION_NAME: {division_obj['divisionName']}",
-            "ROWS:"
-        ]
+        buf = io.StringIO()
+        buf.write(f"DIVISION_CODE: {division_obj['divisionCode']}\nDIVISION_NAME: {division_obj['divisionName']}\nROWS:")
         
         for item in division_obj['items']:
-            line = (
-                f"- [row={item['lineId'].split('-')[-1]}] "
-                f'"{item["tradeDescription"]}" | '
-                f'qty={item["quantity"]} | '
-                f'unit={item["unit"] or "null"} | '
-                f'material={item["materialCost"]} | '
-                f'labor={item["laborCost"]} | '
-                f'subequip={item["subEquipCost"]} | '
-                f'total={item["totalCost"]} | '
-                f'scope="{item["scopeNotes"] or ""}" | '
-                f'est="{item["estimatingNotes"] or "null"}"'
+            # Extract row number from lineId (last part after final dash)
+            row = item['lineId'].rsplit('-', 1)[-1]
+            
+            buf.write(
+                f'\n- [row={row}] "{item["tradeDescription"]}" | qty={item["quantity"]} | '
+                f'unit={item["unit"] or "null"} | material={item["materialCost"]} | labor={item["laborCost"]} | '
+                f'subequip={item["subEquipCost"]} | total={item["totalCost"]} | '
+                f'scope="{item["scopeNotes"] or ""}" | est="{item["estimatingNotes"] or "null"}"'
             )
-            lines.append(line)
         
-        return "\n".join(lines)
+        return buf.getvalue()
+    
+    def _normalize_request(self, pack: str) -> Dict[str, Any]:
+        """
+        Chat completion arguments shared by the sync, async and batch paths
+        """
+        item_count = pack.count('\n- [row=')
+        return {
+            "model": "gpt-4o-mini",
+            "messages": [
+                {"role": "system", "content": NORMALIZE_SYSTEM_PROMPT},
+                {"role": "user", "content": pack}
+            ],
+            "response_format": {"type": "json_object"},
+            "temperature": 0,
+            "max_tokens": min(NORMALIZE_MAX_TOKENS, NORMALIZE_BASE_TOKENS + NORMALIZE_TOKENS_PER_ITEM * item_count)
+        }
+    
+    def _truncated(self, response, request: Dict[str, Any]) -> bool:
+        """
+        True when the sized budget cut the JSON short and a retry at the cap could finish it
+        """
+        return response.choices[0].finish_reason == 'length' and request['max_tokens'] < NORMALIZE_MAX_TOKENS
+    
+    def _normalized_result(self, content: str) -> Dict[str, Any]:
+        """
+        Parse the model's JSON and recompute the division total from items
+        """
+        result = json.loads(content)
+        
+        # Calculate division total from items
+        if 'items' in result:
+            division_total = sum(item.get('totalCost', 0) for item in result['items'])
+            result['divisionTotal'] = round(division_total, 2)
+        
+        return result
+    
+    def _cache_key(self, pack: str) -> str:
+        return hashlib.blake2b(pack.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def _cache_get(self, key: str) -> Optional[str]:
+        with self._cache_lock:
+            content = self._response_cache.get(key)
+            if content is not None:
+                self._response_cache.move_to_end(key)
+            return content
+    
+    def _cache_set(self, key: str, content: str) -> None:
+        with self._cache_lock:
+            self._response_cache[key] = content
+            self._response_cache.move_to_end(key)
+            while len(self._response_cache) > NORMALIZE_CACHE_MAX_ENTRIES:
+                self._response_cache.popitem(last=False)
+    
+    def _cached_result(self, cache_key: str, content: str) -> Dict[str, Any]:
+        """
+        Parse a response and remember it; only responses that parse are cached
+        """
+        result = self._normalized_result(content)
+        self._cache_set(cache_key, content)
+        return result
     
     def normalize_with_chatgpt(self, pack: str) -> Dict[str, Any]:
         """
@@ -518,59 +719,190 @@ class EstimateParser:
             if not pack.strip():
                 return {}
             
-            prompt = f"""You are a construction data normalizer. Clean up this division's text while keeping all numbers exactly the same.
-
-{pack}
-
-Rules:
-1. Keep ALL numeric values exactly as provided (quantities, costs) 
-2. Clean up tradeDescription text (fix typos, standardize format)
-3. Normalize units to: EA, LF, SF, SY, CY, HR, LS (or null if unclear)
-4. Clean up scope notes and estimating notes
-5. Return JSON matching the exact structure
-
-Return JSON format:
-{{
-  "divisionCode": "XX",
-  "divisionName": "cleaned name",
-  "items": [
-    {{
-      "lineId": "same as input",
-      "tradeDescription": "cleaned description",
-      "quantity": exact_number_from_input,
-      "unit": "normalized_unit_or_null",
-      "materialCost": exact_number_from_input,
-      "laborCost": exact_number_from_input,
-      "subEquipCost": exact_number_from_input,
-      "totalCost": exact_number_from_input,
-      "scopeNotes": "cleaned_notes_or_null",
-      "estimatingNotes": "cleaned_notes_or_null"
-    }}
-  ]
-}}
-
-Return ONLY valid JSON, no explanations."""
+            # Normalization runs at temperature 0, so an identical pack gets the same answer
+            cache_key = self._cache_key(pack)
+            content = self._cache_get(cache_key)
+            if content is None:
+                request = self._normalize_request(pack)
+                response = _get_client().chat.completions.create(**request)
+                if self._truncated(response, request):
+                    response = _get_client().chat.completions.create(**dict(request, max_tokens=NORMALIZE_MAX_TOKENS))
+                content = response.choices[0].message.content
             
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a construction data normalizer. Return only valid JSON."},
-                    {"role": "user", "content": prompt}
-                ],
-                response_format={"type": "json_object"},
-                temperature=0,
-                max_tokens=4000
-            )
+            return self._cached_result(cache_key, content)
             
-            result = json.loads(response.choices[0].message.content)
+        except Exception as e:
+            print(f"ChatGPT normalization failed: {str(e)}")
+            return {}
+    
+    def normalize_all_sync(self, packs: List[str]) -> List[Dict[str, Any]]:
+        """
+        Normalize division packs on a thread pool for callers that can't await;
+        results keep the order of packs
+        """
+        if not packs:
+            return []
+        
+        # Network-bound, so threads overlap the requests on the shared pooled client
+        with ThreadPoolExecutor(max_workers=min(NORMALIZE_CONCURRENCY, len(packs))) as executor:
+            return list(executor.map(self.normalize_with_chatgpt, packs))
+    
+    async def _normalize_one(self, pack: str, sem: asyncio.Semaphore) -> Dict[str, Any]:
+        """
+        Async normalization of one division pack
+        """
+        try:
+            if not pack.strip():
+                return {}
             
-            # Calculate division total from items
-            if 'items' in result:
-                division_total = sum(item.get('totalCost', 0) for item in result['items'])
-                result['divisionTotal'] = round(division_total, 2)
+            cache_key = self._cache_key(pack)
+            content = self._cache_get(cache_key)
+            if content is not None:
+                return self._cached_result(cache_key, content)
             
-            return result
+            async with sem:
+                request = self._normalize_request(pack)
+                response = await _get_async_client().chat.completions.create(**request)
+                if self._truncated(response, request):
+                    response = await _get_async_client().chat.completions.create(**dict(request, max_tokens=NORMALIZE_MAX_TOKENS))
+            
+            return self._cached_result(cache_key, response.choices[0].message.content)
             
         except Exception as e:
             print(f"ChatGPT normalization failed: {str(e)}")
-            return {}
\ No newline at end of file
+            return {}
+    
+    async def normalize_all(self, packs: List[str]) -> List[Dict[str, Any]]:
+        """
+        Normalize all division packs concurrently; results keep the order of packs
+        """
+        sem = asyncio.Semaphore(NORMALIZE_CONCURRENCY)
+        return await asyncio.gather(*(self._normalize_one(pack, sem) for pack in packs))
+    
+    def _needs_normalization(self, division: Dict[str, Any]) -> bool:
+        """
+        Cheap check for text the LLM would change: non-ASCII or unprintable
+        descriptions, or doubled spaces. Units need no check, since _extract_unit
+        only ever yields a valid unit or None. There is no dictionary-based typo
+        check (the tree has no word list), so misspellings in otherwise clean
+        ASCII descriptions are passed through as parsed
+        """
+        for item in division.get('items', []):
+            description = item['tradeDescription']
+            if not description.isascii() or not description.isprintable() or '  ' in description:
+                return True
+        return False
+    
+    async def normalize_divisions(self, divisions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Normalize parsed divisions, sending only the ones that look unclean to ChatGPT;
+        clean divisions are returned as parsed. Results keep the order of divisions
+        """
+        pending = [i for i, division in enumerate(divisions) if self._needs_normalization(division)]
+        normalized = await self.normalize_all([self.to_division_pack(divisions[i]) for i in pending])
+        
+        # Passed-through divisions drop any private ("_"-prefixed) parser fields so
+        # every division in the result has the normalized shape
+        results = [self._public_fields(division) for division in divisions]
+        for i, result in zip(pending, normalized):
+            results[i] = result
+        return results
+    
+    def _public_fields(self, division: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Copy of a parsed division without "_"-prefixed keys on it or its items
+        """
+        public = {key: value for key, value in division.items() if not key.startswith('_')}
+        if 'items' in public:
+            public['items'] = [
+                {key: value for key, value in item.items() if not key.startswith('_')}
+                for item in public['items']
+            ]
+        return public
+    
+    def submit_normalize_batch(self, packs: List[str]) -> str:
+        """
+        Upload one normalization request per division pack to the OpenAI Batch API
+        and return the batch id. Empty packs are left out.
+        """
+        lines = []
+        for i, pack in enumerate(packs):
+            if not pack.strip():
+                continue
+            lines.append(json.dumps({
+                "custom_id": f"division-{i}",
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": self._normalize_request(pack)
+            }))
+        
+        buf = io.BytesIO("\n".join(lines).encode('utf-8'))
+        buf.name = "division_batch.jsonl"
+        client = _get_client()
+        input_file = client.files.create(file=buf, purpose="batch")
+        
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        print(f"Submitted normalization batch {batch.id} with {len(lines)} divisions")
+        return batch.id
+    
+    def wait_for_normalize_batch(self, batch_id: str, timeout_seconds: Optional[float] = None) -> Dict[str, str]:
+        """
+        Poll a batch until it finishes and return response content keyed by custom_id
+        """
+        client = _get_client()
+        started = time.monotonic()
+        batch = client.batches.retrieve(batch_id)
+        while batch.status not in BATCH_TERMINAL_STATUSES:
+            if timeout_seconds is not None and time.monotonic() - started > timeout_seconds:
+                raise Exception(f"Timed out waiting for normalization batch {batch_id} (status: {batch.status})")
+            time.sleep(BATCH_POLL_SECONDS)
+            batch = client.batches.retrieve(batch_id)
+        
+        if batch.status != 'completed':
+            raise Exception(f"Normalization batch {batch_id} ended with status: {batch.status}")
+        
+        contents = {}
+        if not batch.output_file_id:
+            return contents
+        
+        output = client.files.content(batch.output_file_id).text
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get('response') or {}
+            if response.get('status_code') != 200:
+                print(f"Normalization request {record.get('custom_id')} failed: {record.get('error')}")
+                continue
+            contents[record['custom_id']] = response['body']['choices'][0]['message']['content']
+        
+        return contents
+    
+    def normalize_with_chatgpt_batch(self, packs: List[str], timeout_seconds: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        Normalize division packs through the Batch API (non-interactive, half the token cost).
+        Results line up with packs; failed or empty packs yield {}.
+        """
+        # Serve cached packs locally and submit only the rest (blanked packs are left out)
+        cache_keys = [self._cache_key(pack) for pack in packs]
+        contents = {f"division-{i}": self._cache_get(key) for i, key in enumerate(cache_keys)}
+        pending = [pack if contents[f"division-{i}"] is None else '' for i, pack in enumerate(packs)]
+        
+        if any(pack.strip() for pack in pending):
+            batch_id = self.submit_normalize_batch(pending)
+            contents.update(self.wait_for_normalize_batch(batch_id, timeout_seconds))
+        
+        results = []
+        for i in range(len(packs)):
+            content = contents.get(f"division-{i}")
+            try:
+                results.append(self._cached_result(cache_keys[i], content) if content is not None else {})
+            except Exception as e:
+                print(f"ChatGPT normalization failed: {str(e)}")
+                results.append({})
+        
+        return results
@@ -1,7 +1,111 @@
+import numpy as np
 import pandas as pd
 import re
 from typing import List, Dict, Any, Tuple, Optional
 import io
+import os
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import python_calamine  # noqa: F401  (Rust-backed reader used by pandas' calamine engine)
+    EXCEL_ENGINE = 'calamine'
+except ImportError:  # Fall back to pandas' default openpyxl reader
+    EXCEL_ENGINE = 'openpyxl'
+
+# Cell text pd.read_excel treats as missing by default; shared by the parsers that
+# read workbooks without pandas so they drop the same values
+NA_STRINGS = frozenset({
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+})
+
+# Everything but digits, '.' and '-' is dropped from text cells before numeric conversion
+_CURRENCY_RE = re.compile(r'[^\d.\-]')
+# What float() accepts once the currency characters are gone
+_PLAIN_NUMBER_RE = re.compile(r'-?(?:\d+\.?\d*|\.\d+)')
+
+# Sheet-name points for "estimate"; a name scoring this much wins without reading other sheets
+ESTIMATE_NAME_SCORE = 50.0
+
+# Upper bound on threads analyzing sheets in parallel (also capped by CPU count)
+ANALYZE_MAX_WORKERS = 8
+
+# Recent analyze_workbook / extract_raw_data results, keyed by upload content hash, so
+# re-posting the same file during preview -> pick sheet -> parse skips the re-read
+RESULT_CACHE_MAX_ENTRIES = 32
+_result_cache: "OrderedDict[tuple, Any]" = OrderedDict()
+_result_cache_lock = threading.Lock()
+
+
+def workbook_digest(file_content: bytes) -> bytes:
+    """Content hash identifying an uploaded workbook"""
+    return hashlib.blake2b(file_content, digest_size=16).digest()
+
+
+def get_cached_result(key: tuple) -> Optional[Any]:
+    """Return a copy of a cached result, or None when it is not cached"""
+    with _result_cache_lock:
+        result = _result_cache.get(key)
+        if result is None:
+            return None
+        _result_cache.move_to_end(key)
+    return copy.deepcopy(result)
+
+
+def cache_result(key: tuple, result: Any) -> None:
+    """Store a copy of a result, evicting the least recently used entries"""
+    result = copy.deepcopy(result)
+    with _result_cache_lock:
+        _result_cache[key] = result
+        _result_cache.move_to_end(key)
+        while len(_result_cache) > RESULT_CACHE_MAX_ENTRIES:
+            _result_cache.popitem(last=False)
+
+
+# Decoded workbooks shared by analyze_workbook, parse_selected_sheet and extract_raw_data,
+# so one upload flow opens the file once; kept small since each entry holds a whole workbook
+WORKBOOK_CACHE_MAX_ENTRIES = 4
+_workbook_cache: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+_workbook_cache_lock = threading.Lock()
+
+
+def _cached_workbook(file_content: bytes) -> Dict[str, Any]:
+    """Cache entry holding the open ExcelFile and the sheets fully read from it so far"""
+    key = workbook_digest(file_content)
+    with _workbook_cache_lock:
+        entry = _workbook_cache.get(key)
+        if entry is not None:
+            _workbook_cache.move_to_end(key)
+            return entry
+    
+    entry = {'excel_file': pd.ExcelFile(io.BytesIO(file_content), engine=EXCEL_ENGINE), 'sheets': {}}
+    with _workbook_cache_lock:
+        entry = _workbook_cache.setdefault(key, entry)
+        _workbook_cache.move_to_end(key)
+        while len(_workbook_cache) > WORKBOOK_CACHE_MAX_ENTRIES:
+            _workbook_cache.popitem(last=False)
+    return entry
+
+
+def open_workbook(file_content: bytes) -> pd.ExcelFile:
+    """Open workbook for these bytes, decoded at most once while cached"""
+    return _cached_workbook(file_content)['excel_file']
+
+
+def read_sheet(file_content: bytes, sheet_name: str) -> pd.DataFrame:
+    """Equivalent of pd.read_excel(file, sheet_name=sheet_name) served from the workbook cache"""
+    entry = _cached_workbook(file_content)
+    df = entry['sheets'].get(sheet_name)
+    if df is None:
+        df = entry['excel_file'].parse(sheet_name)
+        entry['sheets'][sheet_name] = df
+    # Callers rename columns and fill values in place; keep the cached frame untouched
+    return df.copy()
+
 
 class ExcelBudgetParser:
     """Intelligent Excel parser for multi-tab construction budgets"""
@@ -33,107 +137,178 @@ class ExcelBudgetParser:
             'unit_cost': ['unit cost', 'cost', 'price', 'rate', 'unit price', 'cost per unit'],
             'total_cost': ['total', 'total cost', 'amount', 'extended', 'line total', 'subtotal']
         }
+        
+        # Sheet name points per keyword: +50 "estimate", +10 budget words, -30 avoid words
+        self._keyword_scores = {}
+        for keywords, points in ((self.high_priority_keywords, ESTIMATE_NAME_SCORE), (self.budget_keywords, 10.0), (self.avoid_keywords, -30.0)):
+            for keyword in keywords:
+                self._keyword_scores[keyword] = self._keyword_scores.get(keyword, 0.0) + points
+        
+        # One scan per sheet name finds every keyword it contains; a keyword inside a longer
+        # match ("take" in "takeoff") is credited through the containment table
+        self._keyword_re, self._keyword_implies = self._substring_index(self._keyword_scores)
+        
+        # Header matching: one scan per column finds every variation it contains, and each
+        # variation maps back to the budget fields that use it ("amount" -> quantity, total_cost)
+        self._variation_fields = {}
+        for field, variations in self.column_mappings.items():
+            for variation in variations:
+                self._variation_fields.setdefault(variation, []).append(field)
+        self._variation_re, self._variation_implies = self._substring_index(self._variation_fields)
     
-    def analyze_workbook(self, file_content: bytes) -> Dict[str, Any]:
-        """Analyze all worksheets and suggest the best one for budget data"""
+    def _substring_index(self, keywords) -> Tuple[re.Pattern, Dict[str, List[str]]]:
+        """Pattern finding the longest keyword at each position, and the keywords each one contains"""
+        longest_first = sorted(keywords, key=len, reverse=True)
+        pattern = re.compile('(?=(' + '|'.join(map(re.escape, longest_first)) + '))')
+        implies = {keyword: [other for other in keywords if other in keyword] for keyword in keywords}
+        return pattern, implies
+    
+    def _contained(self, text: str, pattern: re.Pattern, implies: Dict[str, List[str]]) -> set:
+        """Every indexed keyword occurring anywhere in text"""
+        return {keyword for match in pattern.finditer(text) for keyword in implies[match.group(1)]}
+    
+    def _column_fields(self, col: str) -> set:
+        """Budget fields with at least one variation occurring in the lowercased column name"""
+        variations = self._contained(col, self._variation_re, self._variation_implies)
+        return {field for variation in variations for field in self._variation_fields[variation]}
+    
+    def analyze_workbook(self, file_content: bytes, force: bool = False) -> Dict[str, Any]:
+        """Analyze all worksheets and suggest the best one for budget data (force=True reads every sheet)"""
+        cache_key = ('analyze_workbook', workbook_digest(file_content), force)
+        cached = get_cached_result(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
-            # Read all sheets
-            excel_file = pd.ExcelFile(io.BytesIO(file_content))
-            sheet_analysis = []
-            print(f"Found {len(excel_file.sheet_names)} sheets: {excel_file.sheet_names}")
+            # Open the workbook once; every sheet preview reads from this handle
+            excel_file = open_workbook(file_content)
+            sheet_names = excel_file.sheet_names
+            print(f"Found {len(sheet_names)} sheets: {sheet_names}")
             
-            for sheet_name in excel_file.sheet_names:
-                try:
-                    print(f"Processing sheet: {sheet_name}")
-                    # Read first 20 rows to analyze
-                    df = pd.read_excel(io.BytesIO(file_content), sheet_name=sheet_name, nrows=20)
-                    print(f"Sheet {sheet_name}: {len(df)} rows, {len(df.columns)} columns")
-                    
-                    score = self._score_sheet(sheet_name, df)
-                    column_suggestions = self._suggest_columns(df)
-                    
-                    # Clean preview data to remove NaN values and ensure JSON serializable
-                    if not df.empty:
-                        preview_df = df.head(3).fillna('')
-                        # Convert all data to strings to avoid any JSON serialization issues
-                        preview_df = preview_df.astype(str)
-                        preview_data = preview_df.to_dict('records')
-                    else:
-                        preview_data = []
-                    
-                    # Ensure column suggestions don't have NaN values
-                    clean_suggestions = {}
-                    for k, v in column_suggestions.items():
-                        if v is not None and str(v) != 'nan':
-                            clean_suggestions[k] = str(v)
-                        else:
-                            clean_suggestions[k] = None
-                    
-                    sheet_info = {
-                        'sheet_name': sheet_name,
-                        'score': float(score) if not pd.isna(score) else 0.0,
-                        'row_count': int(len(df)),
-                        'column_count': int(len(df.columns)),
-                        'suggested_columns': clean_suggestions,
-                        'preview': preview_data
-                    }
-                    
-                    sheet_analysis.append(sheet_info)
-                    print(f"Successfully processed sheet: {sheet_name}")
-                    
-                except Exception as e:
-                    print(f"Error processing sheet {sheet_name}: {str(e)}")
-                    # Skip problematic sheets
+            # Cheap name-only pass first. Once a name earns the "estimate" boost, only it and the
+            # runner-up are read; the rest get name-only stubs flagged deep_parsed=False
+            name_scores = {sheet_name: self._name_score(sheet_name) for sheet_name in sheet_names}
+            ranked = sorted(sheet_names, key=lambda sheet_name: name_scores[sheet_name], reverse=True)
+            if force or not ranked or name_scores[ranked[0]] < ESTIMATE_NAME_SCORE:
+                deep_parse = set(sheet_names)
+            else:
+                deep_parse = set(ranked[:2])
+            
+            parsed = self._analyze_sheets(
+                file_content, excel_file, [sheet_name for sheet_name in sheet_names if sheet_name in deep_parse]
+            )
+            
+            sheet_analysis = []
+            for sheet_name in sheet_names:
+                if sheet_name in deep_parse:
+                    sheet_analysis.append(parsed[sheet_name])
+                else:
                     sheet_analysis.append({
                         'sheet_name': sheet_name,
-                        'score': 0,
-                        'error': str(e)
+                        'score': max(0.0, name_scores[sheet_name]),
+                        'preview': [],
+                        'deep_parsed': False
                     })
             
             # Sort by score (highest first)
             sheet_analysis.sort(key=lambda x: x.get('score', 0), reverse=True)
             
-            return {
-                'total_sheets': len(excel_file.sheet_names),
+            analysis = {
+                'total_sheets': len(sheet_names),
                 'sheet_analysis': sheet_analysis,
                 'recommended_sheet': sheet_analysis[0]['sheet_name'] if sheet_analysis else None
             }
+            cache_result(cache_key, analysis)
+            return analysis
             
         except Exception as e:
             raise Exception(f"Error analyzing Excel workbook: {str(e)}")
     
+    def _analyze_sheets(self, file_content: bytes, excel_file: pd.ExcelFile, sheet_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Analyze each sheet, fanning out across threads when the host has spare cores"""
+        workers = min(ANALYZE_MAX_WORKERS, os.cpu_count() or 1, len(sheet_names))
+        if workers <= 1:
+            return {sheet_name: self._analyze_sheet(excel_file, sheet_name) for sheet_name in sheet_names}
+        
+        # A workbook handle can't be used from two threads at once, so each worker opens its own
+        local = threading.local()
+        
+        def analyze(sheet_name: str) -> Dict[str, Any]:
+            if not hasattr(local, 'excel_file'):
+                local.excel_file = pd.ExcelFile(io.BytesIO(file_content), engine=EXCEL_ENGINE)
+            return self._analyze_sheet(local.excel_file, sheet_name)
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return dict(zip(sheet_names, executor.map(analyze, sheet_names)))
+    
+    def _analyze_sheet(self, excel_file: pd.ExcelFile, sheet_name: str) -> Dict[str, Any]:
+        """Score, column suggestions and preview for one sheet, read from the open workbook"""
+        try:
+            print(f"Processing sheet: {sheet_name}")
+            # Read first 20 rows to analyze from the already-open workbook
+            df = excel_file.parse(sheet_name, nrows=20)
+            print(f"Sheet {sheet_name}: {len(df)} rows, {len(df.columns)} columns")
+            
+            score = self._score_sheet(sheet_name, df)
+            column_suggestions = self._suggest_columns(df)
+            
+            # Clean preview data to remove NaN values and ensure JSON serializable
+            if not df.empty:
+                preview_df = df.head(3).fillna('')
+                # Convert all data to strings to avoid any JSON serialization issues
+                preview_df = preview_df.astype(str)
+                preview_data = preview_df.to_dict('records')
+            else:
+                preview_data = []
+            
+            # Ensure column suggestions don't have NaN values
+            clean_suggestions = {}
+            for k, v in column_suggestions.items():
+                if v is not None and str(v) != 'nan':
+                    clean_suggestions[k] = str(v)
+                else:
+                    clean_suggestions[k] = None
+            
+            sheet_info = {
+                'sheet_name': sheet_name,
+                'score': float(score) if not pd.isna(score) else 0.0,
+                'row_count': int(len(df)),
+                'column_count': int(len(df.columns)),
+                'suggested_columns': clean_suggestions,
+                'preview': preview_data
+            }
+            
+            print(f"Successfully processed sheet: {sheet_name}")
+            return sheet_info
+            
+        except Exception as e:
+            print(f"Error processing sheet {sheet_name}: {str(e)}")
+            # Skip problematic sheets
+            return {
+                'sheet_name': sheet_name,
+                'score': 0,
+                'error': str(e)
+            }
+    
+    def _name_score(self, sheet_name: str) -> float:
+        """Keyword points for a sheet name alone"""
+        found = self._contained(sheet_name.lower(), self._keyword_re, self._keyword_implies)
+        return sum(self._keyword_scores[keyword] for keyword in found)
+    
     def _score_sheet(self, sheet_name: str, df: pd.DataFrame) -> float:
         """Score a worksheet based on how likely it contains budget data"""
         score = 0.0
         
         # Score based on sheet name with HEAVY preference for "Estimate"
-        sheet_name_lower = sheet_name.lower()
-        
-        # High priority keywords get massive boost
-        for keyword in self.high_priority_keywords:
-            if keyword in sheet_name_lower:
-                score += 50.0  # HUGE boost for "estimate"
-        
-        # Regular budget keywords
-        for keyword in self.budget_keywords:
-            if keyword in sheet_name_lower:
-                score += 10.0
-        
-        # Heavy penalty for avoid keywords
-        for keyword in self.avoid_keywords:
-            if keyword in sheet_name_lower:
-                score -= 30.0  # Strong penalty for "pricing", "price", etc.
+        score += self._name_score(sheet_name)
         
         if df.empty:
             return score
         
         # Score based on column headers
         columns_lower = [str(col).lower() for col in df.columns]
-        for category, variations in self.column_mappings.items():
-            for variation in variations:
-                if any(variation in col for col in columns_lower):
-                    score += 5.0
-                    break
+        matched_fields = set().union(*(self._column_fields(col) for col in columns_lower))
+        score += len(matched_fields) * 5.0
         
         # Score based on numeric data presence
         numeric_cols = df.select_dtypes(include=['number']).columns
@@ -149,26 +324,22 @@ class ExcelBudgetParser:
     
     def _suggest_columns(self, df: pd.DataFrame) -> Dict[str, Optional[str]]:
         """Suggest which columns map to which budget fields"""
-        suggestions = {}
+        suggestions = {field: None for field in self.column_mappings}
+        best_scores = {field: 0 for field in self.column_mappings}
         columns_lower = [str(col).lower() for col in df.columns]
         
-        for field, variations in self.column_mappings.items():
-            best_match = None
-            best_score = 0
-            
-            for i, col in enumerate(columns_lower):
-                for variation in variations:
-                    if variation in col:
-                        # Exact matches score higher
-                        score = 10 if variation == col else 5
-                        # Earlier columns score slightly higher (common convention)
-                        score += (len(columns_lower) - i) * 0.1
-                        
-                        if score > best_score:
-                            best_score = score
-                            best_match = df.columns[i]
-            
-            suggestions[field] = best_match
+        # Scan each column once and credit every field it matches
+        for i, col in enumerate(columns_lower):
+            exact_fields = self._variation_fields.get(col, ())
+            for field in self._column_fields(col):
+                # Exact matches score higher
+                score = 10 if field in exact_fields else 5
+                # Earlier columns score slightly higher (common convention)
+                score += (len(columns_lower) - i) * 0.1
+                
+                if score > best_scores[field]:
+                    best_scores[field] = score
+                    suggestions[field] = df.columns[i]
         
         return suggestions
     
@@ -181,7 +352,7 @@ class ExcelBudgetParser:
         """Parse the selected sheet with optional custom column mapping"""
         try:
             # Read the specified sheet
-            df = pd.read_excel(io.BytesIO(file_content), sheet_name=sheet_name)
+            df = read_sheet(file_content, sheet_name)
             
             if df.empty:
                 raise Exception(f"Sheet '{sheet_name}' is empty")
@@ -223,65 +394,76 @@ class ExcelBudgetParser:
                 available_cols = list(df.columns)
                 raise Exception(f"Cannot find required columns: {missing_required}. Available columns: {available_cols}")
             
-            # Extract and clean data
-            budget_items = []
+            # Extract and clean data column by column; to_numpy() yields the
+            # same per-cell values iterrows() did, without building a Series per row
+            labels = {field: col for field, col in mapped_columns.items() if col in df.columns}
+            duplicated = [col for col in labels.values() if not isinstance(df.columns.get_loc(col), int)]
+            if mapped_columns['description'] not in df.columns or duplicated:
+                print(f"Warning: Skipping all rows: columns not found or not unique: {duplicated or mapped_columns['description']}")
+                return []
+            
+            values = df.to_numpy()
+            column_values = {field: values[:, df.columns.get_loc(col)] for field, col in labels.items()}
+            row_count = len(df)
             
-            for index, row in df.iterrows():
-                try:
-                    # Skip rows where description is empty
-                    desc_col = mapped_columns.get('description')
-                    if not desc_col or pd.isna(row[desc_col]) or str(row[desc_col]).strip() == '':
-                        continue
-                    
-                    item = {
-                        'division': self._safe_extract(row, mapped_columns.get('division'), str, ''),
-                        'description': self._safe_extract(row, mapped_columns.get('description'), str, '').strip(),
-                        'quantity': self._safe_extract(row, mapped_columns.get('quantity'), float, 0.0),
-                        'unit': self._safe_extract(row, mapped_columns.get('unit'), str, 'LS'),
-                        'unit_cost': self._safe_extract(row, mapped_columns.get('unit_cost'), float, 0.0),
-                        'total_cost': self._safe_extract(row, mapped_columns.get('total_cost'), float, 0.0),
-                        'notes': self._safe_extract(row, mapped_columns.get('notes'), str, None)
-                    }
-                    
-                    # Calculate missing values
-                    if item['unit_cost'] == 0 and item['total_cost'] > 0 and item['quantity'] > 0:
-                        item['unit_cost'] = item['total_cost'] / item['quantity']
-                    elif item['total_cost'] == 0 and item['unit_cost'] > 0 and item['quantity'] > 0:
-                        item['total_cost'] = item['unit_cost'] * item['quantity']
-                    
-                    # Only include rows with meaningful content
-                    if item['description'] and len(item['description']) > 2:
-                        budget_items.append(item)
-                        
-                except Exception as e:
-                    # Log problematic rows but continue processing
-                    print(f"Warning: Skipping row {index}: {str(e)}")
-                    continue
+            description = self._text_values(column_values['description'], '', row_count)
+            quantity = self._float_values(column_values.get('quantity'), row_count)
+            unit_cost = self._float_values(column_values.get('unit_cost'), row_count)
+            total_cost = self._float_values(column_values.get('total_cost'), row_count)
             
-            return budget_items
+            # Calculate missing values
+            fill_unit = (unit_cost == 0) & (total_cost > 0) & (quantity > 0)
+            fill_total = ~fill_unit & (total_cost == 0) & (unit_cost > 0) & (quantity > 0)
+            unit_cost = np.where(fill_unit, total_cost / np.where(fill_unit, quantity, 1.0), unit_cost)
+            total_cost = np.where(fill_total, unit_cost * quantity, total_cost)
+            
+            columns = {
+                'division': self._text_values(column_values.get('division'), '', row_count),
+                'description': description,
+                'quantity': quantity,
+                'unit': self._text_values(column_values.get('unit'), 'LS', row_count),
+                'unit_cost': unit_cost,
+                'total_cost': total_cost,
+                'notes': self._text_values(column_values.get('notes'), None, row_count)
+            }
+            
+            # Only include rows with meaningful content
+            keep = pd.Series(description, dtype=object).str.len().to_numpy() > 2
+            kept_columns = [column[keep].tolist() for column in columns.values()]
+            return [dict(zip(columns, row)) for row in zip(*kept_columns)]
             
         except Exception as e:
             raise Exception(f"Error parsing sheet '{sheet_name}': {str(e)}")
     
-    def _safe_extract(self, row, column_name: Optional[str], data_type, default_value):
-        """Safely extract and convert data from a row"""
-        if not column_name or column_name not in row:
-            return default_value
+    def _text_values(self, column: Optional[np.ndarray], default_value, row_count: int) -> np.ndarray:
+        """Stripped string form of each cell, or the default for blank cells and unmapped columns"""
+        result = np.full(row_count, default_value, dtype=object)
+        if column is None:
+            return result
         
-        value = row[column_name]
-        if pd.isna(value):
-            return default_value
+        present = ~pd.isna(column)
+        result[present] = pd.Series(column[present], dtype=object).astype(str).str.strip().to_numpy(dtype=object)
+        return result
+    
+    def _float_values(self, column: Optional[np.ndarray], row_count: int) -> np.ndarray:
+        """Numeric value of each cell, stripping currency symbols and commas from text; 0.0 when unparseable"""
+        if column is None:
+            return np.zeros(row_count)
         
+        cells = pd.Series(column, dtype=object)
         try:
-            if data_type == float:
-                # Handle currency symbols, commas, etc.
-                if isinstance(value, str):
-                    clean_value = re.sub(r'[^\d.-]', '', value)
-                    return float(clean_value) if clean_value else default_value
-                return float(value)
-            elif data_type == str:
-                return str(value).strip()
-            else:
-                return data_type(value)
-        except:
-            return default_value
\ No newline at end of file
+            is_text = cells.str.len().notna().to_numpy()
+        except AttributeError:  # No text cells in this column
+            is_text = np.zeros(len(cells), dtype=bool)
+        result = pd.to_numeric(cells.mask(is_text), errors='coerce').to_numpy(dtype=float, copy=True)
+        
+        # Text cells convert only when what remains after cleaning is a plain number. Estimate
+        # columns repeat the same strings ("$0.00", "-", "TBD"), so each distinct one is cleaned once
+        if is_text.any():
+            codes, uniques = pd.factorize(column[is_text])
+            cleaned = pd.Series(uniques, dtype=object).str.replace(_CURRENCY_RE, '', regex=True)
+            plain = cleaned.str.fullmatch(_PLAIN_NUMBER_RE).to_numpy(dtype=bool)
+            unique_values = np.full(len(uniques), np.nan)
+            unique_values[plain] = cleaned[plain].to_numpy(dtype=object).astype(float)
+            result[is_text] = unique_values[codes]
+        return np.nan_to_num(result, nan=0.0, posinf=np.inf, neginf=-np.inf)
\ No newline at end of file
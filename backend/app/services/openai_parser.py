@@ -1,54 +1,303 @@
+import asyncio
+import httpx
 import os
 import json
+import re
 from typing import Dict, List, Any, Optional
-import pandas as pd
-import io
-from openai import OpenAI
+from openai import AsyncOpenAI
+from openpyxl.utils import get_column_letter
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # Fall back to the stdlib decoder
+    orjson = None
+
+from .excel_parser import workbook_digest, get_cached_result, cache_result, read_sheet
+
+# Raw rows per OpenAI request; longer sheets are split and analyzed concurrently
+AI_CHUNK_ROWS = 150
+# Maximum chunk requests in flight at once
+AI_CONCURRENCY = 8
+# Model for both the structured-output and JSON-mode paths; this snapshot supports strict response_format
+AI_MODEL = "gpt-4o-mini-2024-07-18"
+
+# Shared connection pool so every parser reuses TCP/TLS sessions to the API
+HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=32)
+# The SDK adopts a custom client's timeout; keep its 600s default for reads, since
+# non-streamed budget analyses of a full chunk can run well past a minute
+HTTP_TIMEOUT = httpx.Timeout(600.0, connect=5.0)
+
+# The OpenAI client is created on first use and shared by all OpenAIBudgetParser instances
+_async_client: Optional[AsyncOpenAI] = None
+
+
+def _get_async_client() -> AsyncOpenAI:
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=httpx.AsyncClient(limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
+        )
+    return _async_client
+
+
+# First cell of a division header row, e.g. "01 – General Conditions" or "02 Site/Demo"
+# (cost codes such as "01-1100 Permit" or "1200 - Oversight" do not match)
+_DIVISION_HEADER_RE = re.compile(r'^\s*\d{2}\s*[-–—.:]?\s+[^\W\d_]')
+# Characters that would split a TSV cell, mapped to spaces
+_TSV_SEPARATORS = str.maketrans({'\t': ' ', '\r': ' ', '\n': ' '})
+# Schema description for the JSON-mode fallback; structured outputs send the Budget model instead
+JSON_MODE_SCHEMA_PROMPT = """Output JSON schema:
+{
+  "meta": {
+    "client": "string|null",
+    "project": "string|null", 
+    "date": "string|null"
+  },
+  "divisions": [
+    {
+      "divisionCode": "string",
+      "divisionName": "string", 
+      "items": [
+        {
+          "lineId": "string",
+          "tradeDescription": "string",
+          "quantity": 123.45,
+          "unit": "string|null",
+          "materialCost": 0.00,
+          "laborCost": 0.00, 
+          "subEquipCost": 0.00,
+          "totalCost": 1234.56,
+          "scopeNotes": "string|null",
+          "estimatingNotes": "string|null"
+        }
+      ],
+      "divisionTotal": 99999.99
+    }
+  ],
+  "grandTotal": 999999.99
+}"""
+# Example reply for the JSON-mode fallback, serialized once at import
+JSON_MODE_EXAMPLE = json.dumps({
+    "fileName": "example.xlsx",
+    "worksheet": "Estimate",
+    "divisions": [
+        {
+            "divisionCode": "01", 
+            "divisionName": "General Conditions",
+            "total": 25000,
+            "items": [
+                {
+                    "costCode": "1200 - Project Oversight",
+                    "tradeDescription": "Supervision, Coordination, Procurement", 
+                    "total": 22800
+                }
+            ]
+        }
+    ],
+    "grandTotal": 294895
+}, indent=2)
+
+class BudgetMeta(BaseModel):
+    client: Optional[str]
+    project: Optional[str]
+    date: Optional[str]
+
+class BudgetItem(BaseModel):
+    lineId: str
+    tradeDescription: str
+    quantity: Optional[float]
+    unit: Optional[str]
+    materialCost: float
+    laborCost: float
+    subEquipCost: float
+    totalCost: float
+    scopeNotes: Optional[str]
+    estimatingNotes: Optional[str]
+
+class BudgetDivision(BaseModel):
+    divisionCode: str
+    divisionName: str
+    items: List[BudgetItem]
+    divisionTotal: float
+
+class Budget(BaseModel):
+    """Structured-output schema for the AI budget analysis; every field is required so it can run in strict mode"""
+    meta: BudgetMeta
+    divisions: List[BudgetDivision]
+    grandTotal: float
 
 class OpenAIBudgetParser:
     """OpenAI-powered construction budget parser using structured outputs"""
     
     def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.async_client = _get_async_client()
         
-        # Simplified schema to avoid OpenAI validation issues
-        self.use_structured_output = False  # For now, use regular JSON parsing
+        # Structured outputs: the response is validated against Budget server-side
+        self.use_structured_output = True
+        self.schema = Budget
     
     def extract_raw_data(self, file_content: bytes, sheet_name: str) -> List[Dict[str, Any]]:
         """Extract raw data from Excel sheet for AI processing"""
+        cache_key = ('extract_raw_data', workbook_digest(file_content), sheet_name)
+        cached = get_cached_result(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             # Read the specific sheet
-            df = pd.read_excel(io.BytesIO(file_content), sheet_name=sheet_name)
+            df = read_sheet(file_content, sheet_name)
             
             # Convert to clean JSON for AI processing
             # Replace NaN with None for JSON compliance
             df_clean = df.fillna('')
             
+            # Excel column letters (A..Z, AA..) computed once per sheet rather than per cell
+            keys = [f"{get_column_letter(col_index + 1)}_{col_name}" for col_index, col_name in enumerate(df_clean.columns)]
+            
             # Convert to list of dictionaries with row numbers for context
-            raw_data = []
-            for index, row in df_clean.iterrows():
-                row_data = {
+            raw_data = [
+                {
                     'row_number': index + 1,  # 1-based row numbering
-                    'data': {}
+                    'data': {key: str(value) if value != '' else None for key, value in zip(keys, row)}
                 }
-                
-                # Add all column data
-                for col_index, (col_name, value) in enumerate(row.items()):
-                    # Convert column index to Excel letter
-                    excel_col = chr(65 + col_index) if col_index < 26 else f"A{chr(65 + col_index - 26)}"
-                    row_data['data'][f"{excel_col}_{col_name}"] = str(value) if value != '' else None
-                
-                raw_data.append(row_data)
+                for index, row in zip(df_clean.index, df_clean.to_numpy())
+            ]
             
+            cache_result(cache_key, raw_data)
             return raw_data
             
         except Exception as e:
             raise Exception(f"Error extracting data from sheet '{sheet_name}': {str(e)}")
     
-    def analyze_with_openai(self, file_name: str, worksheet: str, raw_data: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Send raw data to OpenAI for intelligent analysis"""
+    async def analyze_with_openai_async(self, file_name: str, worksheet: str, raw_data: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Send raw data to OpenAI in concurrent row chunks and merge the divisions"""
         try:
-            system_prompt = """You are a senior construction cost estimator and data normalizer. You convert an Excel Estimate sheet into a clean, structured JSON budget that is safe for downstream automation (quote comparison, variance analysis, work orders). You must follow the schema, rules, and formatting exactly.
+            chunks = [raw_data[start:start + AI_CHUNK_ROWS] for start in range(0, len(raw_data), AI_CHUNK_ROWS)] or [raw_data]
+            
+            # Division header in effect where each chunk starts, so a slice opening
+            # mid-division still knows which division its first items belong to
+            contexts = []
+            header = None
+            for chunk in chunks:
+                contexts.append(header)
+                for row in chunk:
+                    header = self._division_header_after(row, header)
+            
+            sem = asyncio.Semaphore(AI_CONCURRENCY)
+            results = await asyncio.gather(*(
+                self._analyze_chunk(file_name, worksheet, chunk, context, len(chunks) > 1, len(raw_data), sem)
+                for chunk, context in zip(chunks, contexts)
+            ))
+            result = results[0] if len(results) == 1 else self._merge_analyses(results)
+            
+            print(f"OpenAI analysis complete: {len(result.get('divisions', []))} divisions found in {len(chunks)} chunk(s)")
+            
+            return result
+            
+        except Exception as e:
+            raise Exception(f"OpenAI analysis failed: {str(e)}")
+    
+    async def _analyze_chunk(
+        self,
+        file_name: str,
+        worksheet: str,
+        chunk: List[Dict[str, Any]],
+        division_header: Optional[Dict[str, Any]],
+        chunked: bool,
+        total_rows: int,
+        sem: asyncio.Semaphore
+    ) -> Dict[str, Any]:
+        """Analyze one slice of the sheet's rows"""
+        input_data = {
+            "fileName": file_name,
+            "worksheet": worksheet,
+            "rawData": chunk
+        }
+        if chunked and chunk:
+            # Tell the model this is a slice so a division begun in earlier rows can carry over
+            input_data["rowRange"] = f"rows {chunk[0]['row_number']}-{chunk[-1]['row_number']} of {total_rows}"
+        if division_header is not None:
+            # Repeat the header row of the division this slice opens in, ahead of its rows
+            input_data["divisionContext"] = f"row {division_header['row_number']} is the header of the division in progress; it is context, not an item"
+            input_data["rawData"] = [division_header, *chunk]
+        
+        request = self._chat_request(input_data)
+        async with sem:
+            if self.use_structured_output:
+                response = await self.async_client.beta.chat.completions.parse(**request)
+            else:
+                response = await self.async_client.chat.completions.create(**request)
+        return self._response_json(response)
+    
+    def _division_header_after(self, row: Dict[str, Any], header: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Division header row in effect after `row`, given the one in effect before it"""
+        text = next((value for value in row['data'].values() if value), None)
+        if text is None:
+            return header
+        if 'subtotal' in text.lower():
+            return None  # The division closed
+        if _DIVISION_HEADER_RE.match(text):
+            return row
+        return header
+    
+    def _response_json(self, response) -> Dict[str, Any]:
+        """Analysis dict from a parsed structured output or a JSON-mode reply"""
+        message = response.choices[0].message
+        if self.use_structured_output:
+            if message.parsed is None:
+                raise Exception(f"Model returned no budget: {message.refusal}")
+            return message.parsed.model_dump()
+        return orjson.loads(message.content) if orjson is not None else json.loads(message.content)
+    
+    def _merge_analyses(self, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Combine per-chunk analyses, joining divisions split across chunks by divisionCode"""
+        merged = {key: value for key, value in results[0].items() if key not in ('divisions', 'grandTotal')}
+        divisions: Dict[str, Dict[str, Any]] = {}
+        grand_totals = []
+        
+        for result in results:
+            for division in result.get('divisions', []):
+                code = division.get('divisionCode', '')
+                if code not in divisions:
+                    divisions[code] = dict(division, items=list(division.get('items', [])))
+                    continue
+                
+                existing = divisions[code]
+                existing['items'].extend(division.get('items', []))
+                if not existing.get('divisionName'):
+                    existing['divisionName'] = division.get('divisionName')
+                for total_key in ('divisionTotal', 'total'):
+                    if division.get(total_key):
+                        existing[total_key] = round((existing.get(total_key) or 0) + division[total_key], 2)
+            
+            if result.get('grandTotal') is not None:
+                grand_totals.append(result['grandTotal'])
+        
+        merged['divisions'] = list(divisions.values())
+        if grand_totals:
+            merged['grandTotal'] = round(sum(grand_totals), 2)
+        return merged
+    
+    def _payload_text(self, input_data: Dict[str, Any]) -> str:
+        """User message for a rawData payload: header lines, then the rows as TSV (far fewer tokens than JSON)"""
+        lines = [f"{key}: {value}" for key, value in input_data.items() if key != 'rawData']
+        raw_data = input_data['rawData']
+        if raw_data:
+            lines.append('\t'.join(['row', *(self._tsv_cell(key) for key in raw_data[0]['data'])]))
+            for row in raw_data:
+                cells = (self._tsv_cell(value) for value in row['data'].values())
+                lines.append('\t'.join([str(row['row_number']), *cells]))
+        return '\n'.join(lines)
+    
+    def _tsv_cell(self, value: Optional[str]) -> str:
+        """Blank for empty cells; tabs and line breaks inside a cell become spaces"""
+        return '' if value is None else str(value).translate(_TSV_SEPARATORS)
+    
+    def _chat_request(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Chat completion arguments for analyzing a rawData payload"""
+        system_prompt = """You are a senior construction cost estimator and data normalizer. You convert an Excel Estimate sheet into a clean, structured JSON budget that is safe for downstream automation (quote comparison, variance analysis, work orders). You must follow the schema, rules, and formatting exactly.
 
 Goals:
 - Group line items by division (e.g., "01 – General Conditions", "02 – Site/Demo")
@@ -57,6 +306,9 @@ Goals:
 - Compute division totals and a grand total
 - Output JSON only (no prose), with numbers as plain floats formatted to two decimals
 
+Input format:
+The user message starts with "key: value" lines (fileName, worksheet, and rowRange when the sheet is sent in slices; divisionContext names a repeated division header row from earlier in the sheet that applies to the first rows of the slice). The rest is the sheet as tab-separated values: the first column is the 1-based row number, the header row names every other column as <Excel column letter>_<header>, and empty cells are blank.
+
 Rules (strict):
 1. Division detection: A division is identified by a two-digit code and a name (e.g., 01, 02, 19). Section rows like "03 – Excavation/Landscape Subtotal" define division context but are not items.
 
@@ -70,96 +322,32 @@ Rules (strict):
 
 6. Line IDs: Build a stable lineId using division code and slugified description (e.g., "01-1100-Permit-Job").
 
-Output JSON schema:
-{
-  "meta": {
-    "client": "string|null",
-    "project": "string|null", 
-    "date": "string|null"
-  },
-  "divisions": [
-    {
-      "divisionCode": "string",
-      "divisionName": "string", 
-      "items": [
-        {
-          "lineId": "string",
-          "tradeDescription": "string",
-          "quantity": 123.45,
-          "unit": "string|null",
-          "materialCost": 0.00,
-          "laborCost": 0.00, 
-          "subEquipCost": 0.00,
-          "totalCost": 1234.56,
-          "scopeNotes": "string|null",
-          "estimatingNotes": "string|null"
-        }
-      ],
-      "divisionTotal": 99999.99
-    }
-  ],
-  "grandTotal": 999999.99
-}
-
 Examples of rows to exclude: "* General Conditions Subtotal", "Project Subtotal", "Overhead & Profit (20%)", "Job Total"""
 
-            input_data = {
-                "fileName": file_name,
-                "worksheet": worksheet,
-                "rawData": raw_data  # Process ALL 800+ rows - no arbitrary limits
-            }
+        if self.use_structured_output:
+            # The Budget schema travels with the request, so the prompt needs no schema text
+            return dict(
+                model=AI_MODEL,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": self._payload_text(input_data)}
+                ],
+                response_format=self.schema,
+                temperature=0
+            )
+        else:
+            # Regular JSON mode: describe the schema in the prompt
+            enhanced_prompt = system_prompt + "\n\n" + JSON_MODE_SCHEMA_PROMPT + "\n\nReturn ONLY valid JSON in this exact format:\n" + JSON_MODE_EXAMPLE
             
-            if self.use_structured_output:
-                response = self.client.chat.completions.create(
-                    model="gpt-4o-2024-08-06",
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": json.dumps(input_data)}
-                    ],
-                    response_format=self.schema,
-                    temperature=0
-                )
-            else:
-                # Use regular JSON mode for simplicity
-                enhanced_prompt = system_prompt + "\n\nReturn ONLY valid JSON in this exact format:\n" + json.dumps({
-                    "fileName": "example.xlsx",
-                    "worksheet": "Estimate",
-                    "divisions": [
-                        {
-                            "divisionCode": "01", 
-                            "divisionName": "General Conditions",
-                            "total": 25000,
-                            "items": [
-                                {
-                                    "costCode": "1200 - Project Oversight",
-                                    "tradeDescription": "Supervision, Coordination, Procurement", 
-                                    "total": 22800
-                                }
-                            ]
-                        }
-                    ],
-                    "grandTotal": 294895
-                }, indent=2)
-                
-                response = self.client.chat.completions.create(
-                    model="gpt-4o-mini",  # Use mini for faster, cheaper processing
-                    messages=[
-                        {"role": "system", "content": enhanced_prompt},
-                        {"role": "user", "content": json.dumps(input_data)}
-                    ],
-                    response_format={"type": "json_object"},
-                    temperature=0
-                )
-            
-            # Parse the structured response
-            result = json.loads(response.choices[0].message.content)
-            
-            print(f"OpenAI analysis complete: {len(result.get('divisions', []))} divisions found")
-            
-            return result
-            
-        except Exception as e:
-            raise Exception(f"OpenAI analysis failed: {str(e)}")
+            return dict(
+                model=AI_MODEL,
+                messages=[
+                    {"role": "system", "content": enhanced_prompt},
+                    {"role": "user", "content": self._payload_text(input_data)}
+                ],
+                response_format={"type": "json_object"},
+                temperature=0
+            )
     
     async def parse_budget_with_ai(self, file_content: bytes, file_name: str, sheet_name: str) -> Dict[str, Any]:
         """Complete workflow: extract data + AI analysis"""
@@ -170,49 +358,55 @@ Examples of rows to exclude: "* General Conditions Subtotal", "Project Subtotal"
             raw_data = self.extract_raw_data(file_content, sheet_name)
             print(f"Extracted {len(raw_data)} rows of raw data")
             
-            # Step 2: Send to OpenAI for intelligent analysis  
-            analysis = self.analyze_with_openai(file_name, sheet_name, raw_data)
+            # Step 2: Send to OpenAI for intelligent analysis, in concurrent row chunks
+            analysis = await self.analyze_with_openai_async(file_name, sheet_name, raw_data)
             
             # Step 3: Convert to our database format using the improved schema
-            budget_items = []
-            total_project_value = 0
-            
-            for division in analysis.get('divisions', []):
-                division_total = division.get('divisionTotal', 0)
-                if division_total:
-                    total_project_value += division_total
-                    
-                for item in division.get('items', []):
-                    # Use the improved schema format
-                    budget_item = {
-                        'division': division.get('divisionCode', ''),
-                        'description': item.get('tradeDescription', ''),
-                        'quantity': item.get('quantity'),
-                        'unit': item.get('unit', 'LS'), 
-                        'unit_cost': (item.get('totalCost', 0) / item.get('quantity', 1)) if item.get('quantity') and item.get('quantity') > 0 else 0,
-                        'total_cost': item.get('totalCost', 0),
-                        'notes': f"Material: ${item.get('materialCost', 0):.2f}, Labor: ${item.get('laborCost', 0):.2f}, Sub/Equip: ${item.get('subEquipCost', 0):.2f}",
-                        # Store additional details
-                        'cost_breakdown': {
-                            'lineId': item.get('lineId'),
-                            'material': item.get('materialCost', 0),
-                            'labor': item.get('laborCost', 0), 
-                            'subEquip': item.get('subEquipCost', 0),
-                            'scopeNotes': item.get('scopeNotes'),
-                            'estimatingNotes': item.get('estimatingNotes')
-                        }
-                    }
-                    budget_items.append(budget_item)
+            divisions = analysis.get('divisions', [])
+            total_project_value = sum(division['divisionTotal'] for division in divisions if division.get('divisionTotal'))
+            budget_items = [
+                self._budget_item(division.get('divisionCode', ''), item)
+                for division in divisions
+                for item in division.get('items', [])
+            ]
             
             return {
                 'budget_items': budget_items,
                 'analysis': analysis,
                 'summary': {
-                    'total_divisions': len(analysis.get('divisions', [])),
+                    'total_divisions': len(divisions),
                     'total_items': len(budget_items),
                     'grand_total': analysis.get('grandTotal', total_project_value)  # Use calculated value as fallback
                 }
             }
             
         except Exception as e:
-            raise Exception(f"AI-powered parsing failed: {str(e)}")
\ No newline at end of file
+            raise Exception(f"AI-powered parsing failed: {str(e)}")
+    
+    def _budget_item(self, division_code: str, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Database-format budget item for one AI line item, reading each field once"""
+        quantity = item.get('quantity')
+        total_cost = item.get('totalCost', 0)
+        material_cost = item.get('materialCost', 0)
+        labor_cost = item.get('laborCost', 0)
+        sub_equip_cost = item.get('subEquipCost', 0)
+        
+        # Use the improved schema format
+        return {
+            'division': division_code,
+            'description': item.get('tradeDescription', ''),
+            'quantity': quantity,
+            'unit': item.get('unit', 'LS'),
+            'unit_cost': (total_cost / quantity) if quantity and quantity > 0 else 0,
+            'total_cost': total_cost,
+            'notes': f"Material: ${material_cost:.2f}, Labor: ${labor_cost:.2f}, Sub/Equip: ${sub_equip_cost:.2f}",
+            # Store additional details
+            'cost_breakdown': {
+                'lineId': item.get('lineId'),
+                'material': material_cost,
+                'labor': labor_cost,
+                'subEquip': sub_equip_cost,
+                'scopeNotes': item.get('scopeNotes'),
+                'estimatingNotes': item.get('estimatingNotes')
+            }
+        }
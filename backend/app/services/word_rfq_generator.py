@@ -2,42 +2,106 @@ from docx import Document
 from docx.shared import Inches, Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.oxml.shared import OxmlElement, qn
+import copy
+import hashlib
+import io
+import json
+import multiprocessing
 import os
+import re
 import tempfile
-from typing import Dict, Any
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Dict, Any, List, Optional, Tuple, Union
 from datetime import datetime
 
+# Upper bound on worker processes for bulk RFQ generation (also capped by CPU count)
+RFQ_BULK_MAX_WORKERS = 8
+
+# Recently rendered .docx files, keyed by a hash of everything that goes into them, so
+# previewing or downloading the same scope again skips rebuilding the document
+RFQ_DOCUMENT_CACHE_MAX_ENTRIES = 32
+_document_cache: "OrderedDict[bytes, bytes]" = OrderedDict()
+_document_cache_lock = threading.Lock()
+
+# Leading "1. ".."8. " numbering on AI section headings
+_SECTION_NUM_RE = re.compile(r'^[1-8]\.\s+')
+# Leading markdown "#" marks and "1.1" numbering on AI subsection headings
+_HEADING_MARKS_RE = re.compile(r'^#+\s*')
+_SUBSECTION_NUM_RE = re.compile(r'^\d+\.\d+\s*')
+# AI content lines repeating the header / project table, and closing lines, that are dropped
+_SKIP_LINE_RE = re.compile(
+    'REQUEST FOR QUOTE|PROJECT TITLE:|PROJECT LOCATION:|RFQ NUMBER:|'
+    'DATE ISSUED:|SUBMISSION DEADLINE:|PROJECT:|LOCATION:|DUE DATE',
+    re.IGNORECASE,
+)
+_SKIP_PARAGRAPH_RE = re.compile(r'---|\*\*END|THANK YOU', re.IGNORECASE)
+
+# Style ID behind the 'List Bullet' name in python-docx's default template
+_LIST_BULLET_STYLE_ID = Document().styles['List Bullet'].style_id
+
+
+def _make_paragraph(text: str = '', style_id: Optional[str] = None, bold: bool = False,
+                    size: Optional[Pt] = None):
+    """Build the <w:p> that doc.add_paragraph() plus one add_run(text) would produce"""
+    paragraph = OxmlElement('w:p')
+    if style_id:
+        p_pr = OxmlElement('w:pPr')
+        p_style = OxmlElement('w:pStyle')
+        p_style.set(qn('w:val'), style_id)
+        p_pr.append(p_style)
+        paragraph.append(p_pr)
+    if text:
+        run = OxmlElement('w:r')
+        if bold or size:
+            r_pr = OxmlElement('w:rPr')
+            if bold:
+                r_pr.append(OxmlElement('w:b'))
+            if size:
+                sz = OxmlElement('w:sz')
+                sz.set(qn('w:val'), str(int(size.pt * 2)))  # half-points
+                r_pr.append(sz)
+            run.append(r_pr)
+        # Tabs become <w:tab/> between text pieces, as run.text = text does
+        for i, piece in enumerate(text.split('\t')):
+            if i:
+                run.append(OxmlElement('w:tab'))
+            if piece:
+                t = OxmlElement('w:t')
+                t.text = piece
+                if piece != piece.strip():
+                    t.set(qn('xml:space'), 'preserve')
+                run.append(t)
+        paragraph.append(run)
+    return paragraph
+
+
+def _package_signature(doc: Document) -> Tuple[frozenset, int]:
+    """Part names and relationship count of a document's package"""
+    parts = list(doc.part.package.iter_parts())
+    return frozenset(str(part.partname) for part in parts), sum(len(part.rels) for part in parts)
+
+
+def _zip_static_parts(template_blob: bytes) -> Tuple[bytes, Tuple[frozenset, int]]:
+    """Re-zip every member of the template package except the main document part,
+    returning the archive bytes and the template's package signature"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(template_blob)) as template, \
+            zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as static:
+        for info in template.infolist():
+            if info.filename != 'word/document.xml':
+                static.writestr(info, template.read(info))
+    return buffer.getvalue(), _package_signature(Document(io.BytesIO(template_blob)))
+
 class WordRFQGenerator:
     
-    def generate_rfq_document(self, scope_data: Dict[str, Any], project_data: Dict[str, Any] = None) -> str:
-        """Generate a professional RFQ Word document and return file path"""
-        
-        # Create document
-        doc = Document()
-        
-        # Set document margins
-        sections = doc.sections
-        for section in sections:
-            section.top_margin = Inches(1)
-            section.bottom_margin = Inches(1)
-            section.left_margin = Inches(1)
-            section.right_margin = Inches(1)
-        
-        # Header
-        header = doc.add_heading('REQUEST FOR QUOTE (RFQ)', 0)
-        header.alignment = WD_ALIGN_PARAGRAPH.CENTER
-        
-        # Add spacing
-        doc.add_paragraph()
-        
-        # Project Information Table
-        project_info = doc.add_table(rows=5, cols=2)
-        project_info.style = 'Light Grid Accent 1'
-        
-        # Set column widths
-        for row in project_info.rows:
-            row.cells[0].width = Inches(1.5)
-            row.cells[1].width = Inches(4.0)
+    def generate_rfq_document(self, scope_data: Dict[str, Any], project_data: Dict[str, Any] = None,
+                              return_bytes: bool = False) -> Union[str, bytes]:
+        """Generate a professional RFQ Word document and return file path,
+        or the .docx bytes when return_bytes is set"""
         
         # Fill project info - handle None values safely
         project_name = '[PROJECT NAME]'
@@ -47,24 +111,13 @@ class WordRFQGenerator:
             project_name = project_data.get('name') or '[PROJECT NAME]'
             project_location = project_data.get('location') or '[PROJECT ADDRESS]'
         
-        cells = project_info.rows
-        cells[0].cells[0].text = 'Project Title:'
-        cells[0].cells[1].text = project_name
-        cells[1].cells[0].text = 'Project Location:'
-        cells[1].cells[1].text = project_location
-        cells[2].cells[0].text = 'RFQ Number:'
         scope_id = scope_data.get('id', 'XXXX') if scope_data and isinstance(scope_data, dict) else 'XXXX'
-        cells[2].cells[1].text = f"RFQ-{str(scope_id)[:8].upper()}"
-        cells[3].cells[0].text = 'Date Issued:'
-        cells[3].cells[1].text = datetime.now().strftime('%B %d, %Y')
-        cells[4].cells[0].text = 'Submission Deadline:'
-        cells[4].cells[1].text = '[SUBMISSION DEADLINE - FILL IN]'
-        
-        # Make first column bold
-        for row in project_info.rows:
-            row.cells[0].paragraphs[0].runs[0].font.bold = True
-        
-        doc.add_paragraph()
+        project_values = [
+            project_name,
+            project_location,
+            f"RFQ-{str(scope_id)[:8].upper()}",
+            datetime.now().strftime('%B %d, %Y'),
+        ]
         
         # Main content sections - handle None values safely  
         description = ''
@@ -76,6 +129,46 @@ class WordRFQGenerator:
             specifications = scope_data.get('specifications') or ''
             exclusions = scope_data.get('exclusions') or ''
         
+        # The document is fully determined by these values (the issue date included)
+        cache_key = hashlib.blake2b(
+            json.dumps([project_values, description, specifications, exclusions]).encode(),
+            digest_size=16,
+        ).digest()
+        with _document_cache_lock:
+            content = _document_cache.get(cache_key)
+            if content is not None:
+                _document_cache.move_to_end(cache_key)
+        
+        if content is None:
+            content = self._render_document(project_values, description, specifications, exclusions)
+            with _document_cache_lock:
+                _document_cache[cache_key] = content
+                _document_cache.move_to_end(cache_key)
+                while len(_document_cache) > RFQ_DOCUMENT_CACHE_MAX_ENTRIES:
+                    _document_cache.popitem(last=False)
+        
+        if return_bytes:
+            return content
+        
+        # Save to temporary file
+        temp_dir = tempfile.gettempdir()
+        scope_id_part = str(scope_data.get('id', 'TEMP'))[:8] if scope_data and isinstance(scope_data, dict) else 'TEMP'
+        filename = f"RFQ_{scope_id_part}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
+        file_path = os.path.join(temp_dir, filename)
+        
+        with open(file_path, 'wb') as f:
+            f.write(content)
+        return file_path
+    
+    def _render_document(self, project_values: List[str], description: str, specifications: str,
+                         exclusions: str) -> bytes:
+        """Build the RFQ document and return it as .docx bytes"""
+        
+        # Start from the prebuilt head (margins, title, labelled project table)
+        doc = Document(io.BytesIO(_TEMPLATE_BLOB))
+        for row, value in zip(doc.tables[0].rows, project_values):
+            row.cells[1].text = value
+        
         # Parse and format the AI-enhanced content properly
         if description.strip().startswith('#') or 'DETAILED SCOPE EXPANSION' in description:
             # This is AI-enhanced content, parse it properly
@@ -90,6 +183,90 @@ class WordRFQGenerator:
         if exclusions:
             self._add_section(doc, "EXCLUSIONS", exclusions)
         
+        # Standard sections, contact information and footer are identical in every RFQ
+        sect_pr = doc.element.body.sectPr
+        for element in _STATIC_TAIL:
+            sect_pr.addprevious(copy.deepcopy(element))
+        
+        if _package_signature(doc) != _TEMPLATE_SIGNATURE:
+            # Something added a part or relationship; let python-docx write the whole package
+            buffer = io.BytesIO()
+            doc.save(buffer)
+            return buffer.getvalue()
+        
+        # Only document.xml differs from the template: append it to the pre-zipped
+        # static parts instead of re-serializing and re-deflating styles, theme, etc.
+        buffer = io.BytesIO(_STATIC_PARTS_ZIP)
+        with zipfile.ZipFile(buffer, 'a', zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr(doc.part.partname.membername, doc.part.blob)
+        return buffer.getvalue()
+    
+    def generate_rfq_documents_bulk(self, scopes: List[Dict[str, Any]], project_data: Dict[str, Any] = None) -> List[str]:
+        """Generate one RFQ document per scope and return the file paths in scope order"""
+        # Building a document is pure-Python CPU work, so a batch is spread over processes
+        workers = min(RFQ_BULK_MAX_WORKERS, os.cpu_count() or 1, len(scopes))
+        if workers <= 1:
+            return [self.generate_rfq_document(scope, project_data) for scope in scopes]
+        
+        # Spawn rather than fork: forking a threaded server can copy _document_cache_lock
+        # (or another thread's lock) while held, deadlocking the worker
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            return list(executor.map(_generate_one, scopes, repeat(project_data)))
+    
+    def _build_template(self) -> Tuple[bytes, List[Any]]:
+        """Build the static RFQ scaffolding once: the saved document head (margins, title,
+        labelled project table) and the body elements closing every RFQ"""
+        
+        # Create document
+        doc = Document()
+        
+        # Set document margins
+        sections = doc.sections
+        for section in sections:
+            section.top_margin = Inches(1)
+            section.bottom_margin = Inches(1)
+            section.left_margin = Inches(1)
+            section.right_margin = Inches(1)
+        
+        # Header
+        header = doc.add_heading('REQUEST FOR QUOTE (RFQ)', 0)
+        header.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        
+        # Add spacing
+        doc.add_paragraph()
+        
+        # Project Information Table
+        project_info = doc.add_table(rows=5, cols=2)
+        project_info.style = 'Light Grid Accent 1'
+        
+        # Column widths and bold labels; the values are filled in per RFQ,
+        # except the deadline placeholder
+        project_rows = [
+            ('Project Title:', ''),
+            ('Project Location:', ''),
+            ('RFQ Number:', ''),
+            ('Date Issued:', ''),
+            ('Submission Deadline:', '[SUBMISSION DEADLINE - FILL IN]'),
+        ]
+        for row, (label, value) in zip(project_info.rows, project_rows):
+            label_cell, value_cell = row.cells
+            label_cell.width = Inches(1.5)
+            value_cell.width = Inches(4.0)
+            label_cell.paragraphs[0].add_run(label).font.bold = True
+            if value:
+                value_cell.text = value
+        
+        doc.add_paragraph()
+        
+        buffer = io.BytesIO()
+        doc.save(buffer)
+        template_blob = buffer.getvalue()
+        
+        # Everything added from here on is appended after the scope sections
+        body = doc.element.body
+        head_length = len(body)
+        
         # Standard RFQ sections
         contractor_requirements = """
 • Valid contractor's license for the state of [STATE]
@@ -137,14 +314,9 @@ class WordRFQGenerator:
         footer.alignment = WD_ALIGN_PARAGRAPH.CENTER
         footer.runs[0].font.italic = True
         
-        # Save to temporary file
-        temp_dir = tempfile.gettempdir()
-        scope_id_part = str(scope_data.get('id', 'TEMP'))[:8] if scope_data and isinstance(scope_data, dict) else 'TEMP'
-        filename = f"RFQ_{scope_id_part}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.docx"
-        file_path = os.path.join(temp_dir, filename)
-        
-        doc.save(file_path)
-        return file_path
+        # The head already ends with sectPr, so every new element landed before it
+        static_tail = list(body)[head_length - 1:-1]
+        return template_blob, static_tail
     
     def _add_section(self, doc: Document, title: str, content: str):
         """Add a formatted section to the document"""
@@ -152,84 +324,74 @@ class WordRFQGenerator:
         heading = doc.add_heading(title, level=2)
         heading.runs[0].font.color.rgb = None  # Keep default color
         
+        # Paragraphs are built as raw XML and inserted ahead of the final sectPr
+        append = doc.element.body.sectPr.addprevious
+        
         # Section content
         if not content.strip():
-            doc.add_paragraph("[CONTENT TO BE ADDED]")
-            doc.add_paragraph()
+            append(_make_paragraph("[CONTENT TO BE ADDED]"))
+            append(_make_paragraph())
             return
             
-        lines = content.strip().split('\n')
-        current_paragraph = ""
+        current_paragraph: List[str] = []
         
-        for line in lines:
+        for line in content.splitlines():
             line = line.strip()
             if not line:
                 # Empty line - end current paragraph and start new one
                 if current_paragraph:
-                    doc.add_paragraph(current_paragraph)
-                    current_paragraph = ""
+                    append(_make_paragraph(" ".join(current_paragraph)))
+                    current_paragraph.clear()
                 continue
                 
-            if line.startswith('•') or line.startswith('-'):
+            if line.startswith(('•', '-')):
                 # Finish any current paragraph
                 if current_paragraph:
-                    doc.add_paragraph(current_paragraph)
-                    current_paragraph = ""
+                    append(_make_paragraph(" ".join(current_paragraph)))
+                    current_paragraph.clear()
                 
                 # Add bullet point
-                para = doc.add_paragraph()
-                para.style = 'List Bullet'
-                para.add_run(line.lstrip('•-').strip())
+                append(_make_paragraph(line.lstrip('•-').strip(), style_id=_LIST_BULLET_STYLE_ID))
             elif line.endswith(':') or line.isupper():
                 # This looks like a subheading
                 if current_paragraph:
-                    doc.add_paragraph(current_paragraph)
-                    current_paragraph = ""
+                    append(_make_paragraph(" ".join(current_paragraph)))
+                    current_paragraph.clear()
                 
-                subheading = doc.add_paragraph()
-                run = subheading.add_run(line)
-                run.bold = True
+                append(_make_paragraph(line, bold=True))
             else:
                 # Regular content line
-                if current_paragraph:
-                    current_paragraph += " " + line
-                else:
-                    current_paragraph = line
+                current_paragraph.append(line)
         
         # Add any remaining paragraph
         if current_paragraph:
-            doc.add_paragraph(current_paragraph)
+            append(_make_paragraph(" ".join(current_paragraph)))
         
-        doc.add_paragraph()  # Add spacing
+        append(_make_paragraph())  # Add spacing
 
     def _add_ai_enhanced_content(self, doc: Document, content: str):
         """Parse AI-enhanced content and format it properly"""
-        lines = content.strip().split('\n')
+        # Paragraphs are built as raw XML and inserted ahead of the final sectPr
+        append = doc.element.body.sectPr.addprevious
         
-        for line in lines:
+        for line in content.splitlines():
             line = line.strip()
             if not line:
                 continue
                 
             # Skip ALL unwanted header/project info that duplicates table
-            skip_patterns = [
-                'REQUEST FOR QUOTE', 'PROJECT TITLE:', 'PROJECT LOCATION:', 'RFQ NUMBER:', 
-                'DATE ISSUED:', 'SUBMISSION DEADLINE:', 'PROJECT:', 'LOCATION:', 'DUE DATE'
-            ]
-            if any(skip in line.upper() for skip in skip_patterns):
+            if _SKIP_LINE_RE.search(line):
                 continue
                 
             # Skip lines that are just markdown symbols or empty bullets
-            if line.strip() in ['•', '-', '**', '###', '##', '---', '*']:
+            if line in ('•', '-', '**', '###', '##', '---', '*'):
                 continue
                 
             # Main section headings (### or ##)
-            if line.startswith('###') or line.startswith('##'):
+            if line.startswith(('###', '##')):
                 section_title = line.lstrip('#').strip()
                 # Clean up numbering
-                section_title = section_title.replace('1. ', '').replace('2. ', '').replace('3. ', '')
-                section_title = section_title.replace('4. ', '').replace('5. ', '').replace('6. ', '')
-                section_title = section_title.replace('7. ', '').replace('8. ', '')
+                section_title = _SECTION_NUM_RE.sub('', section_title, count=1)
                 
                 if section_title:
                     heading = doc.add_heading(section_title, level=2)
@@ -237,55 +399,44 @@ class WordRFQGenerator:
                 
             # Subsection headings (#### or numbered like 1.1, 1.2)
             elif line.startswith('####') or (line.split()[0] if line.split() else '').replace('.', '').replace('1', '').replace('2', '').replace('3', '').replace('4', '').replace('5', '') == '':
-                import re
-                subsection_title = re.sub(r'^#+\s*', '', line)  # Remove ###
-                subsection_title = re.sub(r'^\d+\.\d+\s*', '', subsection_title)  # Remove 1.1 numbering
+                subsection_title = _HEADING_MARKS_RE.sub('', line)  # Remove ###
+                subsection_title = _SUBSECTION_NUM_RE.sub('', subsection_title)  # Remove 1.1 numbering
                 
                 if subsection_title:
-                    subheading = doc.add_paragraph()
-                    run = subheading.add_run(subsection_title)
-                    run.bold = True
-                    run.font.size = Pt(12)
-                    subheading.space_before = Pt(8)
-                    subheading.space_after = Pt(4)
-                    subheading.left_indent = Inches(0.25)
+                    append(_make_paragraph(subsection_title, bold=True, size=Pt(12)))
                 continue
                 
             # Subtitle detection (** on both sides) - these become clean subtitles
             elif '**' in line and line.count('**') >= 2:
                 # Clean up the subtitle text completely
-                subtitle_text = line.strip()
-                subtitle_text = subtitle_text.lstrip('•-').strip()  # Remove bullets
+                subtitle_text = line.lstrip('•-').strip()  # Remove bullets
                 subtitle_text = subtitle_text.replace('**', '').strip()  # Remove ALL asterisks
                 subtitle_text = subtitle_text.rstrip(':').strip()  # Remove trailing colon
                 
                 if subtitle_text:
-                    subheading = doc.add_paragraph()
-                    run = subheading.add_run(subtitle_text)
-                    run.bold = True
-                    run.font.size = Pt(11)
-                    subheading.space_before = Pt(3)  # Minimal space before
-                    subheading.space_after = Pt(2)   # Minimal space after
-                    subheading.left_indent = Inches(0.75)  # Better indent under blue heading
+                    append(_make_paragraph(subtitle_text, bold=True, size=Pt(11)))
                 continue
                 
             # Regular bullet points (nested under subtitles)
-            elif line.startswith('•') or line.startswith('-'):
-                para = doc.add_paragraph()
-                para.style = 'List Bullet'
-                para.add_run(line.lstrip('•-').strip())
-                para.left_indent = Inches(1.0)  # Indent bullets under subtitles
-                para.space_after = Pt(3)
+            elif line.startswith(('•', '-')):
+                append(_make_paragraph(line.lstrip('•-').strip(), style_id=_LIST_BULLET_STYLE_ID))
                 continue
                 
             # Regular paragraphs
             else:
-                if line and not any(skip in line.upper() for skip in ['---', '**END', 'THANK YOU']):
-                    para = doc.add_paragraph(line)
-                    if 'Budget Allowance:' in line:
-                        para.runs[0].bold = True
+                if line and not _SKIP_PARAGRAPH_RE.search(line):
+                    append(_make_paragraph(line, bold='Budget Allowance:' in line))
         
-        doc.add_paragraph()
+        append(_make_paragraph())
 
 # Global instance
-word_rfq_generator = WordRFQGenerator()
\ No newline at end of file
+word_rfq_generator = WordRFQGenerator()
+
+
+def _generate_one(scope_data: Dict[str, Any], project_data: Dict[str, Any]) -> str:
+    """Process pool entry point for generate_rfq_documents_bulk"""
+    return word_rfq_generator.generate_rfq_document(scope_data, project_data)
+
+# Built once per process; each RFQ loads the head from these bytes and appends copies of the tail
+_TEMPLATE_BLOB, _STATIC_TAIL = word_rfq_generator._build_template()
+_STATIC_PARTS_ZIP, _TEMPLATE_SIGNATURE = _zip_static_parts(_TEMPLATE_BLOB)
\ No newline at end of file